@@ -0,0 +1,271 @@
+"""Benchmarks of NECSTDB with synthetic NECST workloads.
+
+Usage
+-----
+$ python benchmarks/bench_necstdb.py --output results.json
+$ python benchmarks/bench_necstdb.py --scale 0.1 --compare results.json
+
+Tables are generated in a temporary directory, so the benchmarks run offline. The
+results are saved as JSON, and can be compared against those of another run.
+
+"""
+
+import argparse
+import datetime
+import itertools
+import json
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+import numpy
+import pandas
+
+import necstdb
+
+ASTYPES = ["tuple", "dict", "sa", "df", "raw"]
+
+# Name: (header, number of records at scale 1)
+WORKLOADS = {
+    "scalar": (
+        [
+            {"key": "time", "format": "d"},
+            {"key": "az", "format": "d"},
+            {"key": "el", "format": "d"},
+            {"key": "flag", "format": "?"},
+            {"key": "status", "format": "i"},
+        ],
+        200000,
+    ),
+    "spectral": (
+        [
+            {"key": "time", "format": "d"},
+            {"key": "spectrum", "format": "4096f"},
+            {"key": "total_power", "format": "d"},
+        ],
+        500,
+    ),
+    "string": (
+        [
+            {"key": "time", "format": "d"},
+            {"key": "name", "format": "16s"},
+            {"key": "label", "format": "8s"},
+            {"key": "value", "format": "d"},
+        ],
+        100000,
+    ),
+}
+
+START_TIME = 1.6e9
+
+
+def generate(header: List[Dict[str, str]], nrecords: int) -> Dict[str, Any]:
+    """Synthetic columns of a 100 Hz topic."""
+    rng = numpy.random.default_rng(0)
+    columns = {}
+    for col in header:
+        key, fmt = col["key"], col["format"]
+        if key == "time":
+            columns[key] = START_TIME + numpy.arange(nrecords) / 100
+        elif fmt.endswith("s"):
+            length = int(fmt[:-1])
+            words = [f"{key}{i}".encode()[: length - 2] for i in range(10)]
+            columns[key] = numpy.array(words)[rng.integers(0, 10, nrecords)]
+        elif fmt == "?":
+            columns[key] = rng.integers(0, 2, nrecords).astype(bool)
+        elif fmt == "i":
+            columns[key] = rng.integers(0, 100, nrecords).astype(numpy.int32)
+        else:
+            count = int(fmt[:-1]) if fmt[:-1] else 1
+            shape = (nrecords, count) if count > 1 else (nrecords,)
+            columns[key] = rng.standard_normal(shape)
+    return columns
+
+
+def measure(
+    func: Callable[[], Any], repeat: int, memory: bool = True
+) -> Dict[str, float]:
+    """Elapsed time (minimum and median over runs) and peak traced memory."""
+    elapsed = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed.append(time.perf_counter() - start)
+    result = {"seconds": min(elapsed), "median_seconds": statistics.median(elapsed)}
+    if memory:
+        tracemalloc.start()
+        func()
+        result["peak_bytes"] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return result
+
+
+def bench_workload(
+    db: necstdb.necstdb.necstdb,
+    name: str,
+    header: List[Dict[str, str]],
+    nrecords: int,
+    endian: str,
+    repeat: int,
+) -> Dict[str, Dict[str, float]]:
+    results = {}
+    table_name = f"{name}_{'le' if endian == '<' else 'be'}"
+    columns = generate(header, nrecords)
+    db.create_table(table_name, {"data": [dict(col) for col in header]}, endian)
+
+    # Append, record by record for a part of the data, then in batch.
+    nsingle = min(nrecords, 10000)
+    rows = pandas.DataFrame(
+        {k: v.tolist() if v.ndim > 1 else v for k, v in columns.items()}
+    ).iloc[:nsingle]
+    rows = [necstdb.utils.flatten_data(row) for row in rows.itertuples(index=False)]
+
+    def append():
+        table = db.open_table(table_name, mode="wb")
+        for row in rows:
+            table.append(*row)
+        table.close()
+
+    def append_many():
+        table = db.open_table(table_name, mode="wb")
+        table.append_many(columns)
+        table.close()
+
+    result = measure(append, repeat, memory=False)
+    result["records_per_second"] = nsingle / result["seconds"]
+    results["append"] = result
+    result = measure(append_many, repeat)
+    result["records_per_second"] = nrecords / result["seconds"]
+    results["append_many"] = result
+
+    table = db.open_table(table_name)
+    for astype in ASTYPES:
+        results[f"read[{astype}]"] = measure(lambda: table.read(astype=astype), repeat)
+    projected = [col["key"] for col in header[:2]]
+    for astype in ["tuple", "sa", "df"]:
+        results[f"read_cols[{astype}]"] = measure(
+            lambda: table.read(cols=projected, astype=astype), repeat
+        )
+    t0 = START_TIME + nrecords / 100 * 0.45
+    t1 = START_TIME + nrecords / 100 * 0.55
+    results["read_time_range[sa]"] = measure(
+        lambda: table.read_time_range(t0, t1, astype="sa"), repeat
+    )
+
+    def recovered():
+        # Scan the string lengths on every run, not reusing the saved plan.
+        plan_path = db.path / f"{table_name}.recovery"
+        if plan_path.exists():
+            plan_path.unlink()
+        db.open_table(table_name).recovered.read(astype="sa")
+
+    if any("s" in col["format"] for col in header):
+        results["recovered[sa]"] = measure(recovered, repeat)
+    table.close()
+    return results
+
+
+def run(scale: float, repeat: int, workloads: List[str]) -> Dict[str, Any]:
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        # One database per byte order, as it's a property of the database.
+        dbs = {
+            endian: necstdb.opendb(Path(tmp) / label, mode="w")
+            for endian, label in [("<", "le"), (">", "be")]
+        }
+        for name in workloads:
+            header, nrecords = WORKLOADS[name]
+            nrecords = max(int(nrecords * scale), 100)
+            for endian, db in dbs.items():
+                key = f"{name}/{'le' if endian == '<' else 'be'}"
+                print(f"Running {key} ({nrecords} records)", file=sys.stderr)
+                for bench, result in bench_workload(
+                    db, name, header, nrecords, endian, repeat
+                ).items():
+                    results[f"{key}/{bench}"] = result
+
+        t0, t1 = START_TIME + 10, START_TIME + 20
+        counter = itertools.count()
+        for endian, db in dbs.items():
+            # Fresh destination per run, not to append to the previous output.
+            results[f"relog/{'le' if endian == '<' else 'be'}"] = measure(
+                lambda: necstdb.relog(
+                    db, t0, t1, saveto=Path(tmp) / f"relogged{next(counter)}"
+                ),
+                repeat,
+                memory=False,
+            )
+    return {
+        "meta": {
+            "date": datetime.datetime.now().isoformat(timespec="seconds"),
+            "necstdb": necstdb.__version__,
+            "python": platform.python_version(),
+            "numpy": numpy.__version__,
+            "pandas": pandas.__version__,
+            "platform": platform.platform(),
+            "scale": scale,
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+
+
+def compare(
+    current: Dict[str, Any], baseline: Dict[str, Any], threshold: float
+) -> List[Tuple[str, float]]:
+    """Print time ratios to the baseline, and return the regressions."""
+    regressions = []
+    print(f"{'benchmark':<40} {'baseline':>10} {'current':>10} {'ratio':>7}")
+    for key, result in current["results"].items():
+        if key not in baseline["results"]:
+            continue
+        before, after = baseline["results"][key]["seconds"], result["seconds"]
+        ratio = after / before
+        mark = " *" if ratio > 1 + threshold else ""
+        print(f"{key:<40} {before:>10.4f} {after:>10.4f} {ratio:>7.2f}{mark}")
+        if ratio > 1 + threshold:
+            regressions.append((key, ratio))
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--output", type=Path, help="Save the results to this file.")
+    parser.add_argument("--compare", type=Path, help="Results of a previous run.")
+    parser.add_argument(
+        "--scale", type=float, default=1.0, help="Factor of number of records."
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per benchmark.")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="Slowdown ratio regarded as regression on comparison.",
+    )
+    parser.add_argument(
+        "--workload", choices=list(WORKLOADS), action="append", dest="workloads"
+    )
+    args = parser.parse_args()
+
+    current = run(args.scale, args.repeat, args.workloads or list(WORKLOADS))
+    if args.output is not None:
+        with args.output.open("w") as f:
+            json.dump(current, f, indent=2)
+    else:
+        json.dump(current, sys.stdout, indent=2)
+        print()
+
+    if args.compare is not None:
+        with args.compare.open("r") as f:
+            baseline = json.load(f)
+        if compare(current, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -12,4 +12,6 @@ except:
 
 from .necstdb import opendb
 from .necstdb import relog
+from .necstdb import restore
+from .stats import Stats
 from . import utils
@@ -0,0 +1,350 @@
+"""Read-only access to databases archived by ``necstdb.checkout``."""
+
+import bz2
+import collections
+import gzip
+import io
+import json
+import lzma
+import os
+import pathlib
+import posixpath
+import tarfile
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy
+
+DECOMPRESSORS = {
+    "gz": gzip.decompress,
+    "bz2": bz2.decompress,
+    "xz": lzma.decompress,
+}
+
+MAGIC_NUMBERS = {
+    "gz": b"\x1f\x8b",
+    "bz2": b"BZh",
+    "xz": b"\xfd7zXZ\x00",
+}
+
+# PAX header which marks a member holding bytes appended to a file at the offset.
+ARCHIVE_OFFSET_KEY = "NECSTDB.offset"
+
+
+def seek_index_path(path: os.PathLike) -> pathlib.Path:
+    """Path to the seek index of compressed archive, written by checkout."""
+    path = pathlib.Path(path)
+    return path.with_name(path.name + ".index")
+
+
+class TarArchive:
+    """Tar archive of a database, whose members are read without extraction.
+
+    Members of uncompressed archive are read (or memory-mapped) at their offsets in
+    the archive. Compressed archive written by ``necstdb.checkout`` consists of
+    independently compressed blocks, and its seek index ``{archive}.index`` maps the
+    members to the blocks, so that only the blocks containing requested member are
+    decompressed. Other compressed archives are decompressed up to the member, and
+    recently read members are cached. The seek index is ignored if the archive has
+    been modified since it was written.
+
+    Incremental archives cannot be read this way, as they hold only the bytes
+    appended since the previous checkout; use ``necstdb.restore`` instead.
+
+    Parameters
+    ----------
+    path
+        Path to the tar file.
+
+    """
+
+    cache_size = 8
+
+    def __init__(self, path: os.PathLike) -> None:
+        self.path = pathlib.Path(path)
+        with self.path.open("rb") as f:
+            magic = f.read(6)
+        self.compression = None
+        for compression, number in MAGIC_NUMBERS.items():
+            if magic.startswith(number):
+                self.compression = compression
+
+        self.block_size, self.blocks = None, None
+        index = self._load_seek_index()
+        if index is not None:
+            self.block_size = index["block_size"]
+            self.blocks = numpy.array(index["blocks"], dtype=numpy.int64).reshape(-1, 2)
+            self.members = {k: tuple(v) for k, v in index["members"].items()}
+            incremental = index["incremental"]
+        else:
+            with tarfile.open(self.path, mode="r:*") as tar:
+                infos = [info for info in tar if info.isfile()]
+            self.members = {
+                info.name: (info.offset_data, info.size, info.mtime) for info in infos
+            }
+            incremental = any(ARCHIVE_OFFSET_KEY in info.pax_headers for info in infos)
+        if incremental:
+            raise Exception(
+                f"Archive '{self.path}' is incremental, restore it with the archives "
+                "it's based on by ``necstdb.restore``."
+            )
+
+        headers = [name for name in self.members if name.endswith(".header")]
+        self.root = posixpath.commonpath(
+            [posixpath.dirname(n) for n in headers] or [""]
+        )
+        self._open()
+
+    def __getstate__(self) -> Dict[str, Any]:
+        state = self.__dict__.copy()
+        for key in ["_fd", "_lock", "_cache"]:
+            state.pop(key, None)
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._open()
+
+    def _load_seek_index(self) -> Optional[Dict[str, Any]]:
+        """Load the seek index, if it exists and is up to date with the archive."""
+        if self.compression is None:
+            return None
+        try:
+            with seek_index_path(self.path).open("r") as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return None
+        stat = self.path.stat()
+        if [index.get("size"), index.get("mtime_ns")] != [
+            stat.st_size,
+            stat.st_mtime_ns,
+        ]:
+            return None
+        return index
+
+    def _open(self) -> None:
+        """Initialize the states which cannot be shared with other processes."""
+        self._fd = None
+        self._lock = threading.Lock()
+        self._cache = collections.OrderedDict()
+
+    def read(self, name: str, offset: int = 0, size: Optional[int] = None) -> bytes:
+        """Read ``size`` bytes of a member from ``offset``."""
+        start, length, _ = self.members[name]
+        offset = min(offset, length)
+        size = length - offset if size is None else min(size, length - offset)
+        if self.compression is None:
+            return os.pread(self._file(), size, start + offset)
+        if self.blocks is not None:
+            return self._read_blocks(start + offset, size)
+
+        with self._lock:
+            if name not in self._cache:
+                with tarfile.open(self.path, mode="r:*") as tar:
+                    self._cache[name] = tar.extractfile(name).read()
+            self._cache.move_to_end(name)
+            data = self._cache[name]
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return data[offset : offset + size]
+
+    def memmap(self, name: str) -> numpy.ndarray:
+        """Bytes of a member as an array, mapped without copy if not compressed."""
+        start, length, _ = self.members[name]
+        if (self.compression is None) and (length > 0):
+            return numpy.memmap(
+                self.path, dtype=numpy.uint8, mode="r", offset=start, shape=(length,)
+            )
+        return numpy.frombuffer(self.read(name), dtype=numpy.uint8)
+
+    def _file(self) -> int:
+        if self._fd is None:
+            self._fd = os.open(self.path, os.O_RDONLY)
+        return self._fd
+
+    def _read_blocks(self, start: int, size: int) -> bytes:
+        """Decompress the blocks covering the range of the uncompressed stream."""
+        first = start // self.block_size
+        last = -(-(start + size) // self.block_size)
+        data = []
+        for i in range(first, min(last, len(self.blocks))):
+            with self._lock:
+                if i not in self._cache:
+                    offset, length = (int(x) for x in self.blocks[i])
+                    compressed = os.pread(self._file(), length, offset)
+                    self._cache[i] = DECOMPRESSORS[self.compression](compressed)
+                self._cache.move_to_end(i)
+                data.append(self._cache[i])
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        skip = start - first * self.block_size
+        return b"".join(data)[skip : skip + size]
+
+
+class ArchivePath:
+    """Path to a member of ``TarArchive``, mimicking read-only ``pathlib.Path``."""
+
+    def __init__(self, archive: TarArchive, name: str) -> None:
+        self.archive = archive
+        self.member = name
+
+    def __repr__(self) -> str:
+        return f"ArchivePath({str(self)!r})"
+
+    def __str__(self) -> str:
+        return str(self.archive.path / self.member)
+
+    def __eq__(self, other: Any) -> bool:
+        return isinstance(other, ArchivePath) and (
+            (self.archive.path, self.member) == (other.archive.path, other.member)
+        )
+
+    def __hash__(self) -> int:
+        return hash((self.archive.path, self.member))
+
+    def __truediv__(self, name: str) -> "ArchivePath":
+        return ArchivePath(self.archive, posixpath.join(self.member, name))
+
+    @property
+    def name(self) -> str:
+        return posixpath.basename(self.member)
+
+    @property
+    def suffix(self) -> str:
+        return posixpath.splitext(self.name)[1]
+
+    @property
+    def stem(self) -> str:
+        if not self.name:  # Database at the top of the archive, named after it
+            return self.archive.path.name.split(".")[0]
+        return posixpath.splitext(self.name)[0]
+
+    @property
+    def parent(self) -> "ArchivePath":
+        return ArchivePath(self.archive, posixpath.dirname(self.member))
+
+    def with_name(self, name: str) -> "ArchivePath":
+        return self.parent / name
+
+    def with_suffix(self, suffix: str) -> "ArchivePath":
+        return self.with_name(posixpath.splitext(self.name)[0] + suffix)
+
+    def resolve(self) -> "ArchivePath":
+        return self
+
+    def is_file(self) -> bool:
+        return self.member in self.archive.members
+
+    def is_dir(self) -> bool:
+        prefix = self.member + "/" if self.member else ""
+        return any(name.startswith(prefix) for name in self.archive.members)
+
+    def exists(self) -> bool:
+        return self.is_file() or self.is_dir()
+
+    def iterdir(self) -> Iterator["ArchivePath"]:
+        prefix = self.member + "/" if self.member else ""
+        children = {
+            name[len(prefix) :].split("/", 1)[0]
+            for name in self.archive.members
+            if name.startswith(prefix)
+        }
+        return (self / child for child in sorted(children))
+
+    def stat(self) -> os.stat_result:
+        if not self.exists():
+            raise FileNotFoundError(f"No such member in the archive: '{self}'")
+        _, size, mtime = self.archive.members.get(self.member, (0, 0, 0))
+        mtime_ns = int(mtime * 1e9)
+        return os.stat_result(
+            (0o100444, 0, 0, 1, 0, 0, size, mtime, mtime, mtime)
+            + (mtime, mtime, mtime)
+            + (mtime_ns, mtime_ns, mtime_ns)
+        )
+
+    def open(self, mode: str = "r") -> Any:
+        if any(char in mode for char in "wax+"):
+            raise PermissionError(f"Archived database is read-only: '{self}'")
+        if not self.is_file():
+            raise FileNotFoundError(f"No such member in the archive: '{self}'")
+        file = _MemberFile(self.archive, self.member)
+        return file if "b" in mode else io.TextIOWrapper(io.BufferedReader(file))
+
+    def read_bytes(self) -> bytes:
+        return self.archive.read(self.member)
+
+    def read_text(self) -> str:
+        return self.read_bytes().decode()
+
+    def memmap(self) -> numpy.ndarray:
+        return self.archive.memmap(self.member)
+
+
+class _MemberFile(io.RawIOBase):
+    """Read-only binary file object of an archive member."""
+
+    def __init__(self, archive: TarArchive, name: str) -> None:
+        self.archive = archive
+        self.member = name
+        self.size = archive.members[name][1]
+        self.position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: Any) -> int:
+        data = self.pread(len(buffer), self.position)
+        buffer[: len(data)] = data
+        self.position += len(data)
+        return len(data)
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self.position, io.SEEK_END: self.size}
+        self.position = base[whence] + offset
+        return self.position
+
+    def tell(self) -> int:
+        return self.position
+
+    def pread(self, size: int, offset: int) -> bytes:
+        """Read bytes at ``offset``, without moving the file position."""
+        return self.archive.read(self.member, offset, size)
+
+
+def write_seek_index(
+    path: os.PathLike,
+    block_size: int,
+    blocks: List[Tuple[int, int]],
+    members: Dict[str, Tuple[int, int, int]],
+    incremental: bool = False,
+) -> None:
+    """Write the seek index of compressed archive, once the archive is written.
+
+    Parameters
+    ----------
+    path
+        Path to the archive.
+    block_size
+        Size of the blocks of the tar stream, before compression.
+    blocks
+        Offset and size of each compressed block in the archive.
+    members
+        Offset in the tar stream, size and modification time of each member.
+    incremental
+        Whether any member holds only the bytes appended to a file.
+
+    """
+    stat = pathlib.Path(path).stat()
+    index = {
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "incremental": incremental,
+        "block_size": block_size,
+        "blocks": blocks,
+        "members": members,
+    }
+    with seek_index_path(path).open("w") as f:
+        json.dump(index, f)
@@ -0,0 +1,84 @@
+"""Control over when the appended data are made durable, by fsync."""
+
+import fcntl
+import threading
+import time
+from typing import IO, TYPE_CHECKING, Set
+
+if TYPE_CHECKING:
+    from .necstdb import table
+
+DURABILITY_MODES = ["none", "interval", "group"]
+
+
+class CommitGroup:
+    """Fsync policy shared by the tables of a database.
+
+    Parameters
+    ----------
+    mode
+        One of:
+        - "none": never fsync, the data are written to disk whenever the OS does
+        - "interval": each table fsyncs its files on write, if ``interval`` seconds
+          have passed since its last fsync, and on close
+        - "group": written tables are fsynced all together on ``sync``, which is
+          called by a write when ``interval`` seconds have passed since the last
+          one, after each batch of the asynchronous writer, and on demand
+
+        Records buffered by the flush policies of tables, or pending in the partial
+        block of compressed tables, are not written until flush.
+    interval
+        Seconds between fsyncs.
+
+    """
+
+    def __init__(self, mode: str = "none", interval: float = 1.0) -> None:
+        if mode not in DURABILITY_MODES:
+            raise ValueError(
+                f"Unknown durability mode {mode!r}, "
+                f"should be one of {DURABILITY_MODES}."
+            )
+        self.mode = mode
+        self.interval = interval
+        self._dirty: Set["table"] = set()
+        self._lock = threading.Lock()
+        self._last_sync = time.monotonic()
+
+    def written(self, t: "table") -> None:
+        """Called when the table has written data, either on append or on flush."""
+        if self.mode == "interval":
+            if time.monotonic() - t._last_fsync >= self.interval:
+                t._fsync()
+        elif self.mode == "group":
+            with self._lock:
+                self._dirty.add(t)
+            if time.monotonic() - self._last_sync >= self.interval:
+                self.sync()
+
+    def closed(self, t: "table") -> None:
+        """Called when the table is being closed, after the last flush."""
+        with self._lock:
+            self._dirty.discard(t)
+        if self.mode != "none":
+            t._fsync()
+
+    def sync(self) -> None:
+        """Fsync all the tables written since the last sync."""
+        with self._lock:
+            tables, self._dirty = self._dirty, set()
+            self._last_sync = time.monotonic()
+        for t in tables:
+            t._fsync()
+
+
+def lock(file: IO, name: str) -> None:
+    """Acquire advisory exclusive lock of the file, held until it's closed.
+
+    The file is closed if the lock is held by others.
+
+    """
+    try:
+        fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        file.close()
+        raise Exception(f"Table '{name}' is being written by another writer.")
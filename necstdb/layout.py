@@ -0,0 +1,149 @@
+"""Compiled layout of records, shared by all tables of the same format."""
+
+import functools
+import re
+import struct
+from typing import Any, Dict, Optional, Sequence, Tuple, Union
+
+import numpy
+
+from . import utils
+
+# Format characters whose standard size (with byte order specified) differs from the
+# native size, which numpy always uses.
+STANDARD_SIZE_TYPES = {"l": "i4", "L": "u4"}
+
+
+class RecordLayout:
+    """Byte layout of the records described by header fields, compiled once.
+
+    Instances are memoized by the contents of the fields, so use ``RecordLayout.of``
+    instead of instantiating this class directly.
+
+    Parameters
+    ----------
+    fields
+        Pairs of field name and its format string.
+    endian
+        One of ["", "=", "<", ">"].
+
+    Attributes
+    ----------
+    format: str
+        Format string of a record, for ``struct`` module.
+    struct: struct.Struct
+        Compiled ``format``.
+    size: int
+        Size of a record in bytes.
+    offsets: list of int
+        Offset of each field in a record.
+    sizes: list of int
+        Size of each field, including the alignment padding which follows it.
+    data_keys: list of str
+        Names of the fields except pad ones, which consist of "x" format characters.
+    dtype: numpy.dtype
+        Numpy's structured data type equivalent to ``format``.
+
+    """
+
+    def __init__(self, fields: Tuple[Tuple[str, str], ...], endian: str) -> None:
+        self.fields = fields
+        self.endian = endian
+        self.keys = [key for key, _ in fields]
+        self.formats = [fmt for _, fmt in fields]
+
+        self.format = endian + "".join(self.formats)
+        self.struct = struct.Struct(self.format)
+        self.size = self.struct.size
+        self.offsets = utils.get_struct_indices(self.formats, endian)[:-1]
+        self.sizes = utils.get_struct_sizes(self.formats, endian)
+        self.item_sizes = [struct.calcsize(endian + fmt) for fmt in self.formats]
+        self.data_keys = [key for key, fmt in fields if "x" not in fmt]
+
+        self.dtype = numpy.dtype(
+            {
+                "names": self.keys,
+                "formats": [parse_dtype(fmt, endian) for fmt in self.formats],
+                "offsets": self.offsets,
+                "itemsize": self.size,
+            }
+        )
+        self._raw_dtypes = {}
+
+    @classmethod
+    def of(cls, cols: Sequence[Dict[str, Any]], endian: str = "<") -> "RecordLayout":
+        """Compiled layout of header fields ``cols``, built once per distinct fields.
+
+        Examples
+        --------
+        >>> layout = RecordLayout.of(header["data"], "<")
+        >>> layout.struct.unpack(record)
+
+        """
+        return _compile(tuple((col["key"], col["format"]) for col in cols), endian)
+
+    def raw_dtype(self, keys: Optional[Sequence[str]] = None) -> numpy.dtype:
+        """Data type which maps raw bytes of the fields, at their offsets in records.
+
+        Parameters
+        ----------
+        keys
+            Names of the fields to be mapped. Defaults to all fields.
+
+        """
+        keys = tuple(self.keys if keys is None else keys)
+        if keys not in self._raw_dtypes:
+            index = [self.keys.index(key) for key in keys]
+            self._raw_dtypes[keys] = numpy.dtype(
+                {
+                    "names": list(keys),
+                    "formats": [f"V{self.item_sizes[i]}" for i in index],
+                    "offsets": [self.offsets[i] for i in index],
+                    "itemsize": self.size,
+                }
+            )
+        return self._raw_dtypes[keys]
+
+
+@functools.lru_cache(maxsize=1024)
+def _compile(fields: Tuple[Tuple[str, str], ...], endian: str) -> RecordLayout:
+    return RecordLayout(fields, endian)
+
+
+def parse_dtype(format_character: str, endian: str) -> Union[str, numpy.dtype]:
+    """Numpy's data type equivalent to format string of a field.
+
+    Sequence of a format character is converted to subarray, and mixed format
+    characters are converted to nested structure with fields "f0", "f1", ...
+
+    """
+    tokens = [
+        (int(count) if count else 1, char)
+        for count, char in re.findall(r"(\d*)([^\d\s])", format_character)
+    ]
+    chars = {char for _, char in tokens}
+    if chars == {"s"}:
+        lengths = {count for count, _ in tokens}
+        if len(lengths) == 1:
+            (length,) = lengths
+            count = len(tokens) if len(tokens) > 1 else ""
+            return f"{count}S{length}"
+    elif len(chars) == 1:
+        (char,) = chars
+        count = sum(count for count, _ in tokens)
+        if char == "x":
+            return f"V{count}"
+        if endian not in ["", "@"]:
+            char = STANDARD_SIZE_TYPES.get(char, char)
+        return endian + (f"{count}{char}" if count > 1 else char)
+
+    # Mixed format characters, decoded as nested structure.
+    subformats = [f"{count}{char}" for count, char in tokens]
+    offsets = utils.get_struct_indices(subformats, endian)[:-1]
+    return numpy.dtype(
+        {
+            "names": [f"f{i}" for i in range(len(tokens))],
+            "formats": [parse_dtype(fmt, endian) for fmt in subformats],
+            "offsets": offsets,
+        }
+    )
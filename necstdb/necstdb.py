@@ -7,20 +7,88 @@ timestamp), various kinds of weather data (temperature + humidity + wind speed +
 direction + ... + timestamp), etc.
 """
 
+import asyncio
+import bisect
+import bz2
+import collections
+import concurrent.futures
+import functools
+import gzip
+import itertools
 import json
+import lzma
 import mmap
 import os
 import pathlib
-import re
 import struct
 import tarfile
-from typing import Any, Dict, List, Tuple, Union
+import time
+import warnings
+import zlib
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
 
 import numpy
 import pandas
 
 from . import utils
+from .archive import ARCHIVE_OFFSET_KEY, ArchivePath, TarArchive, write_seek_index
+from .durability import CommitGroup, lock
+from .layout import RecordLayout
 from .recover import recover
+from .stats import Stats
+from .writer import AsyncTable, AsyncWriter
+
+CODECS = {"zlib": zlib, "bz2": bz2, "lzma": lzma}
+# Partial statistics merged across chunks of records on aggregation; how each of
+# them is computed from the values, and how they are combined. Means and sums of
+# squared deviations from them ("m2") are merged together by Chan's parallel
+# algorithm, which doesn't suffer from cancellation when the mean is large.
+_AGGREGATORS = {
+    "sum": (lambda x: x, numpy.add),
+    "mean": (lambda x: x, None),
+    "m2": (numpy.zeros_like, None),
+    "min": (lambda x: x, numpy.fmin),
+    "max": (lambda x: x, numpy.fmax),
+}
+
+# Header entries which are set by ``create_table`` from its arguments.
+_DERIVED_HEADER_KEYS = ["struct_indices", "layout", "compression"]
+
+# Name of the file which caches header summaries of the tables in a database.
+CATALOG_NAME = ".catalog"
+
+# Compressors of archive members, which produce complete streams so that the
+# independently compressed members can be concatenated.
+ARCHIVE_COMPRESSORS = {
+    "gz": gzip.compress,
+    "bz2": bz2.compress,
+    "xz": functools.partial(lzma.compress, format=lzma.FORMAT_XZ),
+}
+
+# Name of the file which records the state of the files at the last checkout.
+CHECKOUT_STATE_NAME = ".checkout"
+
+# Number of bytes at the end of append-only files, whose checksum is recorded on
+# checkout to tell if the file has only been appended to since then.
+CHECKOUT_FINGERPRINT_BYTES = 4096
+
+# How incomplete records at the end of tables are repaired, see ``table``.
+REPAIR_POLICIES = ["truncate", "pad", None]
+
+BLOCK_INDEX_DTYPE = numpy.dtype(
+    [("offset", "<u8"), ("size", "<u8"), ("nrecords", "<u8")]
+)
 
 
 def duplicate_rename(path: pathlib.Path, _i: int = 0) -> pathlib.Path:
@@ -47,17 +115,48 @@ class necstdb:
         Path to the database directory, the direct parent of *.data and *.header files.
     mode: str
         Mode in which the database is opened, either "r" or "w".
+    stats: bool or Stats
+        If True, I/O and decoding of the tables are counted in ``stats`` attribute.
+        Stats instance can be given to share the counters among databases.
+    durability: str
+        When the written data are fsynced, one of ["none", "interval", "group"], see
+        ``CommitGroup``.
+    fsync_interval: float
+        Seconds between fsyncs, for "interval" and "group" durability modes.
+    lock: bool
+        If True, tables opened for writing are locked by ``flock``, so that other
+        processes (or other table objects) cannot write to them at the same time.
 
     """
 
-    def __init__(self, path: os.PathLike, mode: str) -> None:
+    stats = None
+    lock = False
+    _async_writer = None
+
+    def __init__(
+        self,
+        path: os.PathLike,
+        mode: str,
+        stats: Union[bool, Stats] = False,
+        durability: str = "none",
+        fsync_interval: float = 1.0,
+        lock: bool = False,
+    ) -> None:
+        self.stats = stats if isinstance(stats, Stats) else (Stats() if stats else None)
+        self.durability = CommitGroup(durability, fsync_interval)
+        self.lock = lock
         self.opendb(path, mode)
 
     def opendb(self, path: os.PathLike, mode: str) -> None:
-        """Catch the database directory."""
+        """Catch the database directory, or a tar archive of it."""
         self.path = pathlib.Path(path)
 
-        if not self.path.exists():
+        if self.path.is_file() and tarfile.is_tarfile(self.path):
+            if mode.find("w") != -1:
+                raise Exception("Archived database is read-only.")
+            archive = TarArchive(self.path)
+            self.path = ArchivePath(archive, archive.root)
+        elif not self.path.exists():
             if mode.find("w") != -1:
                 self.path.mkdir(parents=True)
             elif mode.find("r") != -1:
@@ -65,16 +164,115 @@ class necstdb:
 
     def list_tables(self) -> List[str]:
         """List all tables within the database."""
-        data = [path.stem for path in self.path.glob("*.data")]
-        header = [path.stem for path in self.path.glob("*.header")]
-        return sorted(set(data) & set(header))
+        return sorted(self._scan())
+
+    def _scan(self, incomplete: bool = False) -> Dict[str, Dict[str, pathlib.Path]]:
+        """Find tables by a single scan of the database directory.
+
+        Parameters
+        ----------
+        incomplete
+            If True, tables lacking either of header or data file are also returned.
+
+        Returns
+        -------
+        Maps table names to the paths to their files, keyed by suffix.
+
+        """
+        entries = collections.defaultdict(dict)
+        if isinstance(self.path, ArchivePath):
+            paths = self.path.iterdir()
+        else:
+            with os.scandir(self.path) as it:
+                paths = [pathlib.Path(entry.path) for entry in it]
+        for path in paths:
+            name, _, suffix = path.name.rpartition(".")
+            if name and (suffix in ["data", "header", "index", "columns"]):
+                entries[name][suffix] = path
+        return {
+            name: files
+            for name, files in entries.items()
+            if incomplete or (("data" in files) and ("header" in files))
+        }
+
+    def _load_catalog(self) -> Dict[str, Any]:
+        """Load cached header summaries of the tables."""
+        try:
+            with (self.path / CATALOG_NAME).open("r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {"tables": {}}
+
+    def _save_catalog(self, catalog: Dict[str, Any]) -> None:
+        """Save the catalog, if the database is writable."""
+        try:
+            tmp_path = self.path / (CATALOG_NAME + ".tmp")
+            with tmp_path.open("w") as f:
+                json.dump(catalog, f)
+            os.replace(tmp_path, self.path / CATALOG_NAME)
+        except OSError:  # Read-only database, the catalog is just not cached.
+            pass
+
+    @staticmethod
+    def _catalog_entry(header_path: pathlib.Path) -> Dict[str, Any]:
+        """Summary of a table header, to be cached in the catalog."""
+        stat = header_path.stat()
+        with header_path.open("r") as f:
+            header = json.load(f)
+        return {
+            "header": [stat.st_mtime_ns, stat.st_size],
+            "formats": [[col["key"], col["format"]] for col in header["data"]],
+            "layout": header.get("layout", "row"),
+            "compression": header.get("compression"),
+        }
 
     def create_table(
-        self, name: str, config: Dict[str, Any], endian: str = "<"
+        self,
+        name: str,
+        config: Dict[str, Any],
+        endian: str = "<",
+        layout: str = "row",
+        compression: Optional[str] = None,
+        block_records: int = 4096,
+        zonemap: Optional[List[str]] = None,
     ) -> None:
-        """Create a pair of data and header files, then write header content."""
+        """Create a pair of data and header files, then write header content.
+
+        Parameters
+        ----------
+        name
+            Name of the table.
+        config
+            Data information, see README.
+        endian
+            One of ["=", "<", ">"].
+        layout
+            Storage layout of the table, either "row" or "column". In column-major
+            layout, each field is stored in its own file under ``{name}.columns``
+            directory, so that reading some of the fields doesn't touch the others.
+        compression
+            If given, the records are stored in blocks compressed by this codec, one
+            of ["zlib", "bz2", "lzma"]. Offsets of the blocks are kept in
+            ``{name}.index`` file, so that only the blocks containing the requested
+            records are decompressed on reading. Appended records are written once a
+            block is filled, or on ``flush()``/``close()`` of the table. Only row-major
+            layout supports this.
+        block_records
+            Number of records in a compressed block, or in a block of zone map.
+        zonemap
+            Names of numeric scalar fields, whose per-block min/max statistics are
+            maintained in ``{name}.zonemap`` file as the records are appended. See
+            ``table.query``.
+
+        """
         if name in self.list_tables():
             return
+        if layout not in ["row", "column"]:
+            raise ValueError(f"Unknown layout {layout}.")
+        if (compression is not None) and (compression not in CODECS):
+            raise ValueError(f"Unknown compression {compression}.")
+        if (compression is not None) and (layout != "row"):
+            raise ValueError("Only row-major table can be compressed.")
         self.endian = endian
 
         format_list = [dat["format"] for dat in config["data"]]
@@ -84,19 +282,220 @@ class necstdb:
         for dat, size in zip(config["data"], struct_sizes):
             dat["size"] = size
         config["struct_indices"] = True
+        if layout != "row":
+            config["layout"] = layout
+        if compression is not None:
+            config["compression"] = {
+                "codec": compression,
+                "block_records": block_records,
+            }
 
         data_path = self.path / (name + ".data")
         header_path = self.path / (name + ".header")
 
+        if layout == "column":
+            column_dir = self.path / (name + ".columns")
+            column_dir.mkdir(exist_ok=True)
+            for dat in config["data"]:
+                if "x" not in dat["format"]:
+                    (column_dir / (dat["key"] + ".data")).touch()
+        if compression is not None:
+            (self.path / (name + ".index")).touch()
         data_path.touch()
         with header_path.open("w") as f:
             json.dump(config, f)
 
-    def open_table(self, name: str, mode: str = "rb") -> "table":
-        """Topic-wise data table."""
+        catalog = self._load_catalog()
+        catalog["tables"][name] = self._catalog_entry(header_path)
+        self._save_catalog(catalog)
+
+        if zonemap is not None:
+            _table = self.open_table(name)
+            _table.build_zonemap(zonemap, block_records)
+            _table.close()
+
+    def build_zonemap(
+        self, name: str, keys: List[str], block_records: Optional[int] = None
+    ) -> None:
+        """Build per-block min/max statistics of a table, to skip blocks on query.
+
+        Parameters
+        ----------
+        name
+            Name of the table.
+        keys
+            Names of numeric scalar fields to be indexed.
+        block_records
+            Number of records in a block. Defaults to the block size of compressed
+            table, 4096 otherwise.
+
+        """
+        _table = self.open_table(name)
+        try:
+            _table.build_zonemap(keys, block_records)
+        finally:
+            _table.close()
+
+    def open_table(
+        self,
+        name: str,
+        mode: str = "rb",
+        flush_records: Optional[int] = None,
+        flush_bytes: Optional[int] = None,
+        flush_interval: Optional[float] = None,
+        repair: Optional[str] = None,
+    ) -> "table":
+        """Topic-wise data table.
+
+        Parameters
+        ----------
+        name
+            Name of the table.
+        mode
+            Mode in which the table is opened (e.g. ["rb", "ab", ...]).
+        flush_records, flush_bytes, flush_interval
+            Flush policies of appended data, see ``table``.
+        repair
+            How incomplete record left by an interrupted write is repaired, when the
+            table is opened for writing, see ``table``.
+
+        """
+        options = dict(
+            flush_records=flush_records,
+            flush_bytes=flush_bytes,
+            flush_interval=flush_interval,
+            stats=self.stats,
+            commit_group=self.durability,
+            lock=self.lock,
+            repair=repair,
+        )
         if hasattr(self, "endian"):
-            return table(self.path, name, mode, self.endian)
-        return table(self.path, name, mode)
+            return table(self.path, name, mode, self.endian, **options)
+        return table(self.path, name, mode, **options)
+
+    def async_table(
+        self, name: str, maxsize: int = 1024, overflow: str = "block"
+    ) -> AsyncTable:
+        """Asynchronous appender of a table, which never blocks the event loop.
+
+        Appended records are queued, and written in the background by a writer
+        shared among the tables of this database. Call ``aclose`` to write out the
+        queued records and close the tables.
+
+        Parameters
+        ----------
+        name
+            Name of the table.
+        maxsize
+            Maximum number of appends queued but not written yet.
+        overflow
+            What to do when the queue is full; "block" waits until the queued
+            records are written (back-pressure), "drop" discards the appended records
+            and counts them in ``dropped`` attribute.
+
+        Examples
+        --------
+        >>> weather = db.async_table("weather")
+        >>> await weather.append(1.6e9, 25.0, 0.6)
+        >>> await db.aclose()
+
+        """
+        if self._async_writer is None:
+            self._async_writer = AsyncWriter(self)
+        return self._async_writer.open(name, maxsize, overflow)
+
+    def sync(self) -> None:
+        """Fsync the tables written since the last sync, in "group" durability mode."""
+        self.durability.sync()
+
+    async def aclose(self) -> None:
+        """Write out the records appended via ``async_table``, and close the tables."""
+        writer, self._async_writer = self._async_writer, None
+        if writer is not None:
+            await writer.close()
+
+    def read_tables(
+        self,
+        names: Optional[List[str]] = None,
+        cols: Union[List[str], Dict[str, List[str]]] = [],
+        astype: str = "tuple",
+        max_workers: Optional[int] = None,
+        processes: bool = False,
+        max_bytes: Optional[int] = None,
+    ) -> Dict[str, Union[tuple, dict, numpy.ndarray, pandas.DataFrame, bytes]]:
+        """Read multiple tables concurrently.
+
+        Parameters
+        ----------
+        names
+            Names of the tables to be read. All tables are read by default.
+        cols
+            Names of the fields to be picked up, common to all tables, or dict which
+            maps table names to them.
+        astype
+            Return type, see ``table.read``.
+        max_workers
+            Maximum number of tables read at the same time.
+        processes
+            If True, the tables are read in a process pool instead of a thread pool.
+            This may be faster for the astypes decoded in Python (e.g. "tuple"), but
+            the results should be pickled to be passed back.
+        max_bytes
+            Upper limit of total size of the data files being read at the same time.
+            A table larger than this is read alone.
+
+        Returns
+        -------
+        dict
+            Maps table names to their contents.
+
+        Examples
+        --------
+        >>> data = db.read_tables(["weather", "encoder"], astype="df", max_workers=4)
+        >>> data["weather"]
+
+        """
+        available = self.list_tables()
+        names = available if names is None else names
+        for name in names:
+            if name not in available:
+                raise Exception(f"Table '{name}' does not exist.")
+
+        sizes = {name: (self.path / (name + ".data")).stat().st_size for name in names}
+        endian = getattr(self, "endian", "<")
+        # Counters cannot be shared with other processes.
+        stats = None if processes else self.stats
+        Executor = (
+            concurrent.futures.ProcessPoolExecutor
+            if processes
+            else concurrent.futures.ThreadPoolExecutor
+        )
+
+        results = {}
+        with Executor(max_workers=max_workers) as executor:
+            pending, in_flight = {}, 0
+            for name in names:
+                while pending and (max_bytes is not None):
+                    if in_flight + sizes[name] <= max_bytes:
+                        break
+                    done, _ = concurrent.futures.wait(
+                        pending, return_when=concurrent.futures.FIRST_COMPLETED
+                    )
+                    for future in done:
+                        results[pending[future]] = future.result()
+                        in_flight -= sizes[pending.pop(future)]
+
+                _cols = cols.get(name, []) if isinstance(cols, dict) else cols
+                future = executor.submit(
+                    _read_table, self.path, name, endian, _cols, astype, stats
+                )
+                pending[future] = name
+                in_flight += sizes[name]
+
+            for future, name in pending.items():
+                results[name] = future.result()
+
+        return {name: results[name] for name in names}
 
     def save_file(self, name: str, data: Union[str, bytes], info: str = "") -> None:
         """Save a file in database.
@@ -160,7 +559,15 @@ class necstdb:
             )
         return data, info
 
-    def checkout(self, saveto: os.PathLike, compression: str = None) -> None:
+    def checkout(
+        self,
+        saveto: os.PathLike,
+        compression: str = None,
+        incremental: bool = False,
+        max_workers: Optional[int] = None,
+        block_size: int = 4 * 1024**2,
+        progress: Optional[Callable[[int, int, float], None]] = None,
+    ) -> Dict[str, float]:
         """Archive the database.
 
         Parameters
@@ -169,32 +576,252 @@ class necstdb:
             Path to the tar file to be created.
         compression: str
             Compression format/program to be used. One of ["gz", "bz2", "xz"].
+        incremental: bool
+            If True, only the files changed since the last checkout are archived. Data
+            files of uncompressed tables, which are only appended to, are archived as
+            the appended byte ranges. Use ``necstdb.restore`` to extract the archives.
+        max_workers: int, optional
+            Number of threads compressing the archive in parallel.
+        block_size: int
+            Size of the blocks of the tar stream, compressed independently.
+        progress: callable, optional
+            Called with the number of bytes archived so far, the total number of bytes
+            to be archived, and the throughput in bytes per second, after each file.
+
+        Returns
+        -------
+        Summary of the checkout; number of files and bytes archived, size of the
+        archive, elapsed time and throughput.
+
+        Notes
+        -----
+        The compressed archive consists of independently compressed members, which
+        are concatenated into a single valid gzip/bzip2/xz stream.
+
+        Examples
+        --------
+        >>> db.checkout("night1.tar.gz", compression="gz")
+        >>> db.checkout("night1-1.tar.gz", compression="gz", incremental=True)
 
         """
-        mode = "w:"
+        if (compression is not None) and (compression not in ARCHIVE_COMPRESSORS):
+            raise ValueError(f"Unknown compression {compression}.")
+        start_time = time.monotonic()
+        saveto = pathlib.Path(saveto)
+        state_path = self.path / CHECKOUT_STATE_NAME
+        state = {"files": {}}
+        if incremental:
+            try:
+                with state_path.open("r") as f:
+                    state = json.load(f)
+            except (OSError, ValueError):
+                pass
+
+        members, files = [], {}
+        for dirpath, dirnames, filenames in os.walk(self.path):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                path = pathlib.Path(dirpath) / filename
+                relpath = path.relative_to(self.path).as_posix()
+                if filename.startswith(CHECKOUT_STATE_NAME) or (
+                    path.resolve() == saveto.resolve()
+                ):
+                    continue
+                stat = path.stat()
+                files[relpath] = [stat.st_size, stat.st_mtime_ns]
+                append_only = self._is_append_only(path)
+                if append_only:
+                    files[relpath].append(_tail_crc(path, stat.st_size))
+                previous = state["files"].get(relpath)
+                if (previous is not None) and (previous[:2] == files[relpath][:2]):
+                    continue
+                offset = 0
+                if (
+                    append_only
+                    and (previous is not None)
+                    and (len(previous) > 2)
+                    and (previous[0] <= stat.st_size)
+                    and (_tail_crc(path, previous[0]) == previous[2])
+                ):
+                    # Bytes before the previous size are unchanged, as far as the
+                    # fingerprint tells; not truncated and regrown since then.
+                    offset = previous[0]
+                members.append((path, offset, stat.st_size))
+        total = sum(size - offset for _, offset, size in members)
+
+        mode = "w"
+        with saveto.open("wb") as f:
+            writer = f
+            if compression is not None:
+                writer = _ParallelCompressor(
+                    f, ARCHIVE_COMPRESSORS[compression], block_size, max_workers
+                )
+                mode = "w|"
+            with tarfile.open(fileobj=writer, mode=mode) as tar:
+                tar.add(self.path, recursive=False)
+                done, offsets = 0, {}
+                for path, offset, size in members:
+                    info = tar.gettarinfo(path)
+                    if offset > 0:
+                        info.size = size - offset
+                        info.pax_headers = {ARCHIVE_OFFSET_KEY: str(offset)}
+                    with path.open("rb") as member:
+                        member.seek(offset)
+                        tar.addfile(info, member)
+                    padded = -(-info.size // tarfile.BLOCKSIZE) * tarfile.BLOCKSIZE
+                    offsets[info.name] = (tar.offset - padded, info.size, info.mtime)
+                    done += size - offset
+                    if progress is not None:
+                        elapsed = time.monotonic() - start_time
+                        progress(done, total, done / max(elapsed, 1e-9))
+            if compression is not None:
+                writer.close()
         if compression is not None:
-            mode += compression
+            incremental = any(offset > 0 for _, offset, _ in members)
+            write_seek_index(saveto, block_size, writer.blocks, offsets, incremental)
+
+        try:
+            tmp_path = state_path.with_name(CHECKOUT_STATE_NAME + ".tmp")
+            with tmp_path.open("w") as f:
+                json.dump({"files": files}, f)
+            os.replace(tmp_path, state_path)
+        except OSError:  # Read-only database, next checkout will be a full one.
+            pass
+
+        elapsed = time.monotonic() - start_time
+        return {
+            "files": len(members),
+            "bytes": total,
+            "archive_bytes": saveto.stat().st_size,
+            "seconds": elapsed,
+            "throughput": total / max(elapsed, 1e-9),
+        }
+
+    def _is_append_only(self, path: pathlib.Path) -> bool:
+        """Whether the file is only appended to, i.e. data of uncompressed table."""
+        if path.suffix != ".data":
+            return False
+        if path.parent.suffix == ".columns":
+            return True
+        return not path.with_suffix(".index").exists()
+
+    def verify(self) -> pandas.DataFrame:
+        """Check all tables for damage left by interrupted writes.
+
+        Only the headers are parsed and the sizes of the files are compared, so no
+        data are decoded. Damaged tables are repaired when opened for writing, see
+        ``table``.
+
+        Returns
+        -------
+        DataFrame indexed by table names, whose "damaged" column tells if the table
+        has incomplete data or cannot be opened.
 
-        tar = tarfile.open(saveto, mode=mode)
-        tar.add(self.path)
-        tar.close()
+        """
+        tables = self._scan(incomplete=True)
+        dictlist = []
+        for name, files in sorted(tables.items()):
+            dic = {
+                "table name": name,
+                "layout": None,
+                "#records": 0,
+                "torn [byte]": 0,
+                "lost blocks": 0,
+                "padded records": 0,
+                "error": None,
+            }
+            missing = [s for s in ["header", "data"] if s not in files]
+            if missing:
+                dic["error"] = f"Missing .{missing[0]} file."
+            else:
+                try:
+                    with warnings.catch_warnings():  # Damage is reported instead.
+                        warnings.simplefilter("ignore")
+                        _table = self.open_table(name)
+                except Exception as e:
+                    dic["error"] = str(e)
+                else:
+                    dic["layout"] = _table.layout
+                    dic["#records"] = _table.nrecords
+                    dic["torn [byte]"] = _table.torn_bytes
+                    dic["lost blocks"] = _table.lost_blocks
+                    dic["padded records"] = len(_table.padded_records)
+                    _table.close()
+            dic["damaged"] = (dic["error"] is not None) or bool(
+                dic["torn [byte]"] or dic["lost blocks"]
+            )
+            dictlist.append(dic)
+
+        columns = ["table name", "layout", "#records", "torn [byte]", "lost blocks"]
+        columns += ["padded records", "error", "damaged"]
+        return pandas.DataFrame(dictlist, columns=columns).set_index("table name")
 
     def get_info(self) -> pandas.DataFrame:
-        """Get metadata of all tables in the database."""
-        names = self.list_tables()
+        """Get metadata of all tables in the database.
+
+        Notes
+        -----
+        Header summaries are cached in the catalog file of the database, and are
+        re-read only when the header has been modified. Sizes and numbers of records
+        are derived from ``stat`` of the files, so data files are never opened.
+
+        """
+        tables = self._scan()
+        catalog = self._load_catalog()
+        modified = set(catalog["tables"]) != set(tables)
+        endian = getattr(self, "endian", "<")
 
         dictlist = []
-        for name in names:
-            table = self.open_table(name)
+        for name, files in sorted(tables.items()):
+            header_stat = files["header"].stat()
+            entry = catalog["tables"].get(name)
+            if (entry is None) or (
+                entry["header"] != [header_stat.st_mtime_ns, header_stat.st_size]
+            ):
+                entry = self._catalog_entry(files["header"])
+                modified = True
+            formats = [fmt for _, fmt in entry["formats"]]
+            record_size = struct.calcsize(endian + "".join(formats))
+
+            size = files["data"].stat().st_size
+            nrecords = size // record_size
+            if entry["layout"] == "column":
+                column_dir = files["columns"]
+                columns = [
+                    (key, fmt) for key, fmt in entry["formats"] if "x" not in fmt
+                ]
+                sizes = [
+                    (column_dir / f"{key}.data").stat().st_size for key, _ in columns
+                ]
+                counts = [
+                    _size // struct.calcsize(endian + fmt)
+                    for _size, (_, fmt) in zip(sizes, columns)
+                ]
+                size, nrecords = sum(sizes), min(counts, default=0)
+            elif entry["compression"] is not None:
+                index_stat = files["index"].stat()
+                index_key = [index_stat.st_mtime_ns, index_stat.st_size]
+                if entry.get("index") != index_key:
+                    index = _block_index(files["index"].read_bytes())
+                    index = index[: _complete_blocks(index, size)]
+                    entry["index"] = index_key
+                    entry["nrecords"] = int(index["nrecords"].sum())
+                    modified = True
+                nrecords = entry["nrecords"]
+            catalog["tables"][name] = entry
+
             dic = {
                 "table name": name,
-                "file size [byte]": table.stat.st_size,
-                "#records": table.nrecords,
-                "record size [byte]": table.record_size,
-                "format": table.format,
+                "file size [byte]": size,
+                "#records": nrecords,
+                "record size [byte]": record_size,
+                "format": endian + "".join(formats),
             }
             dictlist.append(dic)
-            table.close()
+
+        if modified:
+            catalog["tables"] = {name: catalog["tables"][name] for name in tables}
+            self._save_catalog(catalog)
 
         df = pandas.DataFrame(
             dictlist,
@@ -223,6 +850,32 @@ class table:
         Mode in which the database is opened (e.g. ["rb", "wb", ...]).
     endian: str
         One of ["=", "<", ">"].
+    flush_records: int, optional
+        If given, appended data are buffered, and written when this number of records
+        are accumulated.
+    flush_bytes: int, optional
+        If given, appended data are buffered, and written when the buffer exceeds this
+        size in bytes.
+    flush_interval: float, optional
+        If given, appended data are buffered, and written when this number of seconds
+        has passed since the last flush. The interval is checked on appending, there's
+        no background timer.
+    stats: Stats, optional
+        Counters of the database. If given, I/O and decoding of this table are
+        counted in ``stats`` attribute, and added to them as well.
+    commit_group: CommitGroup, optional
+        Fsync policy of the database.
+    lock: bool
+        If True and the table is opened for writing, the data file is locked by
+        ``flock`` until the table is closed.
+    repair: str, optional
+        How to repair the incomplete record (or block) left by an interrupted write,
+        when the table is opened for writing. "truncate" removes it, "pad" fills the
+        incomplete record of row-major table with null bytes and records its index in
+        ``padded_records``, and None (default) raises an error, since the incomplete
+        data cannot be told from the data of wrongly specified format, which
+        ``recovered`` may restore. Reading never modifies the files, but always
+        excludes the incomplete data.
 
     Notes
     -----
@@ -240,16 +893,51 @@ class table:
     stat = None
     nrecords = 0
     endian = ""
+    block_cache_size = 32
+    decompress_workers = None
+    stats = None
+    _view = None
+    _commit_group = None
+    _flock = False
+    _unsynced = False
+    _repair_policy = None
 
     def __init__(
-        self, dbpath: pathlib.Path, name: str, mode: str, endian: str = "<"
+        self,
+        dbpath: pathlib.Path,
+        name: str,
+        mode: str,
+        endian: str = "<",
+        flush_records: Optional[int] = None,
+        flush_bytes: Optional[int] = None,
+        flush_interval: Optional[float] = None,
+        stats: Optional[Stats] = None,
+        commit_group: Optional[CommitGroup] = None,
+        lock: bool = False,
+        repair: Optional[str] = None,
     ) -> None:
+        if repair not in REPAIR_POLICIES:
+            raise ValueError(
+                f"Unknown repair policy {repair!r}, should be one of {REPAIR_POLICIES}."
+            )
+        self._repair_policy = repair
         self.dbpath = dbpath
         self.endian = endian
-        self.open(name, mode)
-
+        self.stats = None if stats is None else Stats(parent=stats)
+        self._commit_group = commit_group
+        self._flock = lock
+        self._last_fsync = time.monotonic()
         self._name = name
         self._mode = mode
+        self.open(name, mode)
+
+        self._monotonic = {}
+
+        self._flush_policy = (flush_records, flush_bytes, flush_interval)
+        self._buffered = any(policy is not None for policy in self._flush_policy)
+        self._buffer = bytearray()
+        self._buffer_records = 0
+        self._last_flush = time.monotonic()
 
     def open(self, table_name: str, mode: str) -> None:
         """Open a data table of specified topic."""
@@ -259,33 +947,283 @@ class table:
         if not (data_path.exists() and header_path.exists()):
             raise Exception(f"Table '{table_name}' does not exist.")
 
+        if self.stats is not None:
+            opened = time.perf_counter()
         self.data_file = data_path.open(mode)
+        if self._flock and self.data_file.writable():
+            lock(self.data_file, table_name)
         with header_path.open("r") as header_file:
             self.header = json.load(header_file)
 
-        format_list = [dat["format"] for dat in self.header["data"]]
-        self.format = self.endian + "".join(format_list)
-        self.record_size = struct.calcsize(self.format)
+        record_layout = RecordLayout.of(self.header["data"], self.endian)
+        if self.stats is not None:
+            parsed = time.perf_counter()
+            self.stats.record("header", table_name, seconds=parsed - opened)
+        self.format = record_layout.format
+        self._struct = record_layout.struct
+        self.record_size = record_layout.size
+        self.layout = self.header.get("layout", "row")
         self.stat = data_path.stat()
         self.nrecords = self.stat.st_size // self.record_size
+        self._view = None
 
         if self.header.get("struct_indices", False) is False:
             # Infer sizes
-            struct_sizes = utils.get_struct_sizes(format_list, self.endian)
-            for dat, size in zip(self.header["data"], struct_sizes):
+            for dat, size in zip(self.header["data"], record_layout.sizes):
                 dat["size"] = size
             self.header["struct_indices"] = True
 
+        self.compression = self.header.get("compression")
+        self.torn_bytes, self.lost_blocks = 0, 0
+        if "w" not in mode:  # Otherwise all the files are being truncated.
+            self.torn_bytes, self.lost_blocks = self._inspect_tail()
+        if (self.torn_bytes or self.lost_blocks) and self.data_file.writable():
+            self._repair_tail()
+            warnings.warn(
+                f"Table '{table_name}' ended with incomplete data ({self.torn_bytes} "
+                f"bytes, {self.lost_blocks} blocks), which have been repaired by "
+                f"{self._repair_policy!r} policy."
+            )
+            self.stat = data_path.stat()
+            self.nrecords = self.stat.st_size // self.record_size
+        elif self.torn_bytes or self.lost_blocks:
+            warnings.warn(
+                f"Table '{table_name}' ends with incomplete data ({self.torn_bytes} "
+                f"bytes, {self.lost_blocks} blocks), which are excluded from reads. "
+                "They may be left by an interrupted write, or the data format may be "
+                "wrongly specified; try ``table.recovered`` for the latter."
+            )
+
+        self._column_files = {}
+        if self.layout == "column":
+            paths = self._column_paths()
+            self._column_files = {
+                key: path.open(mode) for key, (path, _) in paths.items()
+            }
+            self.nrecords = min(
+                [path.stat().st_size // size for path, size in paths.values()],
+                default=0,
+            )
+
+        self._zonemap_unindexed = 0
+        self._zonemap_path = self.dbpath / (table_name + ".zonemap")
+        self._zonemap_maintained = self._zonemap_path.exists() and (
+            self.data_file.writable()
+        )
+        if self._zonemap_maintained:
+            with self._zonemap_path.open("r") as f:
+                self._zonemap_block_records = json.load(f)["block_records"]
+
+        self._index_file = None
+        if self.compression is not None:
+            self._codec = CODECS[self.compression["codec"]]
+            self._index_file = (self.dbpath / (table_name + ".index")).open(mode)
+            block_index = self._read_block_index()
+            self.nrecords = int(block_index["nrecords"].sum())
+            self._nblocks = len(block_index)
+            self._block_pending = bytearray()
+            self._block_rewrite = None
+            self._block_cache = collections.OrderedDict()
+            block_records = self.compression["block_records"]
+            if self._index_file.writable() and self._nblocks > 0:
+                offset, _, nrecords = block_index[-1]
+                if nrecords < block_records:  # Continue filling the last block
+                    blocks = _BlockMap(self)
+                    _, data = blocks.window(self.nrecords - 1, self.nrecords)
+                    blocks.close()
+                    self._block_pending += data
+                    self._block_rewrite = (int(offset), self._nblocks - 1)
+
+        if self._zonemap_maintained and ("w" in mode):
+            self._update_zonemap()  # Records covered by the zone map are truncated.
+
+        if self.stats is not None:
+            self.stats.record("open", table_name, seconds=time.perf_counter() - opened)
+
     def close(self) -> None:
         """Close the data file of the table."""
+        if not self.data_file.closed:
+            self.flush()
+            if self._zonemap_maintained and self._zonemap_unindexed:
+                self._update_zonemap()
+            if self._commit_group is not None:
+                self._commit_group.closed(self)
         self.data_file.close()
+        for column_file in self._column_files.values():
+            column_file.close()
+        if self._index_file is not None:
+            self._index_file.close()
 
     def append(self, *data: Any) -> None:
         """Append data to the table."""
-        self.data_file.write(struct.pack(self.format, *data))
+        if self.stats is None:
+            return self._write(self._struct.pack(*data), 1)
+        started = time.perf_counter()
+        self._write(self._struct.pack(*data), 1)
+        self._record("append", started, bytes_written=self.record_size, records=1)
+
+    def append_many(
+        self,
+        data: Union[numpy.ndarray, Dict[str, Any], pandas.DataFrame, Sequence[Any]],
+    ) -> None:
+        """Append multiple records to the table at once.
+
+        Parameters
+        ----------
+        data
+            Records to be appended, one of:
+            - structured array, whose fields are picked up by name
+            - dict or DataFrame, which maps field names to columns
+            - sequence of rows, each of which is flattened as arguments of ``append``
+
+        Examples
+        --------
+        >>> table.append_many({"timestamp": [1.0, 2.0], "array": [[1, 2], [3, 4]]})
+        >>> table.append_many([(1.0, 1, 2), (2.0, 3, 4)])
+
+        """
+        if self.stats is not None:
+            started = time.perf_counter()
+        encoded = self._encode_many(data)
+        nrecords = len(encoded) // self.record_size
+        self._write(encoded, nrecords)
+        if self.stats is not None:
+            self._record(
+                "append", started, bytes_written=len(encoded), records=nrecords
+            )
+
+    def _encode_many(
+        self,
+        data: Union[numpy.ndarray, Dict[str, Any], pandas.DataFrame, Sequence[Any]],
+    ) -> bytes:
+        """Encode multiple records, given in any form ``append_many`` accepts."""
+        if isinstance(data, numpy.ndarray) and (data.dtype.names is not None):
+            return self._encode_columns({k: data[k] for k in data.dtype.names})
+        if isinstance(data, (dict, pandas.DataFrame)):
+            return self._encode_columns(data)
+        pack = self._struct.pack
+        return b"".join([pack(*utils.flatten_data(row)) for row in data])
+
+    def _encode_columns(self, columns: Dict[str, Any]) -> bytes:
+        """Encode columns of data into records, using numpy."""
+        data_field = [
+            col["key"] for col in self.header["data"] if "x" not in col["format"]
+        ]
+        missing = [key for key in data_field if key not in columns]
+        if missing:
+            raise ValueError(f"Missing columns: {missing}")
+
+        nrecords = len(columns[data_field[0]]) if data_field else 0
+        if nrecords == 0:  # Empty columns may not be shaped as the fields.
+            return b""
+        records = numpy.zeros(
+            nrecords,
+            dtype=self._structured_dtype(self.header["data"], self.record_size),
+        )
+        for key in data_field:
+            values = columns[key]
+            if isinstance(values, pandas.Series):
+                values = values.to_numpy()
+            if isinstance(values, numpy.ndarray) and (values.dtype == object):
+                values = values.tolist()
+            records[key] = values
+        return records.tobytes()
+
+    def flush(self) -> None:
+        """Write buffered data to the data file."""
+        if self.stats is not None:
+            started = time.perf_counter()
+        if self._buffer:
+            self._write_records(self._buffer)
+            self._buffer = bytearray()
+            self._buffer_records = 0
+        if self.compression is not None:
+            self._write_blocks(partial=True)
+            # Blocks should reach the file before the index entries pointing to them.
+            self.data_file.flush()
+            self._index_file.flush()
+        self.data_file.flush()
+        for column_file in self._column_files.values():
+            column_file.flush()
+        self._last_flush = time.monotonic()
+        if self.stats is not None:
+            self._record("flush", started)
+        if self._unsynced and (self._commit_group is not None):
+            self._commit_group.written(self)
+
+        if self._zonemap_maintained and (
+            self._zonemap_unindexed >= self._zonemap_block_records
+        ):
+            self._update_zonemap()
+
+    def _record(self, event: str, started: float, **counts: Any) -> None:
+        """Count an event of this table, which started at ``started``."""
+        self.stats.record(
+            event, self._name, seconds=time.perf_counter() - started, **counts
+        )
+
+    def _write(self, data: bytes, nrecords: int) -> None:
+        """Write encoded records, respecting the flush policies."""
+        self._zonemap_unindexed += nrecords
+        if not self._buffered:
+            self._write_records(data)
+            if self._commit_group is not None:
+                self._commit_group.written(self)
+            return
+
+        self._buffer += data
+        self._buffer_records += nrecords
+        flush_records, flush_bytes, flush_interval = self._flush_policy
+        if (
+            ((flush_records is not None) and (self._buffer_records >= flush_records))
+            or ((flush_bytes is not None) and (len(self._buffer) >= flush_bytes))
+            or (
+                (flush_interval is not None)
+                and (time.monotonic() - self._last_flush >= flush_interval)
+            )
+        ):
+            self.flush()
+
+    def _fsync(self) -> None:
+        """Make the data written so far durable."""
+        if self.data_file.closed or (not self._unsynced):
+            return
+        if self.stats is not None:
+            started = time.perf_counter()
+        # Blocks should reach the disk before the index entries pointing to them.
+        files = [self.data_file, self._index_file, *self._column_files.values()]
+        for file in files:
+            if file is not None:
+                file.flush()
+                os.fsync(file.fileno())
+        self._unsynced = False
+        self._last_fsync = time.monotonic()
+        if self.stats is not None:
+            self._record("fsync", started)
+
+    def _write_records(self, data: bytes) -> None:
+        """Write encoded records to the data file(s)."""
+        self._unsynced = True
+        if self.compression is not None:
+            self._block_pending += data
+            self._write_blocks()
+        elif self.layout == "column":
+            cols = [col for col in self.header["data"] if "x" not in col["format"]]
+            records = numpy.frombuffer(data, dtype=self._raw_dtype(cols))
+            for key, column_file in self._column_files.items():
+                column_file.write(records[key].tobytes())
+        else:
+            self.data_file.write(data)
 
     def read(
-        self, num: int = -1, start: int = 0, cols: List[str] = [], astype: str = "tuple"
+        self,
+        num: int = -1,
+        start: int = 0,
+        cols: List[str] = [],
+        astype: str = "tuple",
+        every: int = 1,
+        workers: Optional[int] = None,
+        expand_arrays: bool = False,
     ) -> Union[tuple, dict, numpy.ndarray, pandas.DataFrame, bytes]:
         """Read the contents of the table.
 
@@ -301,63 +1239,1075 @@ class table:
             One of ["tuple", "dict", "structuredarray", "dataframe", "buffer"] or their
             aliases, ["structured_array", "array", "sa", "data_frame", "pandas", "df",
             "raw"].
+        every: int
+            Read every ``every``-th record, for decimated quick look. Only the picked
+            records are copied out of the memory map and decoded.
+        workers: int, optional
+            If given, the records are split into this number of chunks, which are
+            mapped and decoded in a process pool. This speeds up the astypes decoded
+            in Python (e.g. "tuple" and "dict") on large tables, but the results
+            should be pickled to be passed back. Decoding in the workers is not
+            counted in ``stats``.
+        expand_arrays: bool
+            If True, array fields of DataFrame output are split into one column per
+            element, named ``{key}_{i}`` (e.g. "array_0", "array_1", ...), instead of
+            a column of tuples.
 
         """
-        mm = mmap.mmap(self.data_file.fileno(), 0, prot=mmap.PROT_READ)
-        mm.seek(start * self.record_size)
+        if every < 1:
+            raise ValueError(f"every should be a positive integer, got {every}.")
+        if expand_arrays:
+            if astype not in ["dataframe", "data_frame", "pandas", "df"]:
+                raise ValueError("expand_arrays is available for DataFrame output.")
+            array = self.read(num, start, cols, "sa", every, workers)
+            return self._data_frame(array, expand_arrays=True)
+        index = slice(start, None if num == -1 else start + num, every)
+        if (workers is not None) and (workers > 1):
+            return self._read_parallel(index, cols, astype, workers)
+        return self._read(index, cols, astype)
+
+    def _read_parallel(
+        self, index: slice, cols: List[str], astype: str, workers: int
+    ) -> Union[tuple, dict, numpy.ndarray, pandas.DataFrame, bytes]:
+        """Read the records selected by ``index`` in chunks, in a process pool."""
+        start, stop, step = index.indices(self._count_records())
+        total = len(range(start, stop, step))
+        bounds = [start + (total * i // workers) * step for i in range(workers + 1)]
+        chunks = [slice(b0, b1, step) for b0, b1 in zip(bounds[:-1], bounds[1:])]
+        chunks = [chunk for chunk in chunks if chunk.start != chunk.stop]
+        if len(chunks) < 2:
+            return self._read(index, cols, astype)
+
+        # Header is passed, since it may be modified (e.g. by ``recovered``).
+        args = (self.dbpath, self._name, self.endian, self.header["data"])
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(_read_range, *args, chunk, cols, astype)
+                for chunk in chunks
+            ]
+            parts = [future.result() for future in futures]
+        return _concat(parts)
+
+    def aggregate(
+        self,
+        bucket: float,
+        key: str = "time",
+        funcs: List[str] = ["mean", "min", "max"],
+        cols: Optional[List[str]] = None,
+        astype: str = "dataframe",
+        records_per_chunk: int = 100000,
+        ddof: int = 0,
+    ) -> Union[dict, numpy.ndarray, pandas.DataFrame]:
+        """Statistics of the fields over fixed-width buckets of the timestamps.
+
+        The records are scanned chunk by chunk, and the statistics of each chunk are
+        merged into the running ones, so that the whole table is never decoded at once.
 
-        if cols == []:
-            data = self._read_all_cols(mm, num)
+        Parameters
+        ----------
+        bucket: float
+            Width of the buckets, in the unit of the timestamps. Buckets are aligned to
+            multiples of this width.
+        key: str
+            Name of the timestamp field.
+        funcs: list of str
+            Statistics to be computed, any of ["count", "sum", "mean", "std", "min",
+            "max"].
+        cols: list of str, optional
+            Names of the numeric scalar fields to be aggregated. Defaults to all of them
+            except the timestamp field.
+        astype: str
+            One of ["dict", "structuredarray", "dataframe"] or their aliases.
+        records_per_chunk: int
+            Number of records processed at a time.
+        ddof: int
+            Delta degrees of freedom of "std", whose divisor is ``count - ddof``.
+            Defaults to 0, the population standard deviation as ``numpy.std``; give
+            1 for the sample standard deviation as ``pandas.DataFrame.std``. NaN if
+            the divisor isn't positive.
+
+        Returns
+        -------
+        Start of the buckets (in ``key`` column), and the statistics named
+        ``{field}_{func}``. Only non-empty buckets are included.
+
+        Examples
+        --------
+        >>> table.aggregate(10, key="timestamp", funcs=["mean", "max"], cols=["az"])
+
+        """
+        unknown = set(funcs) - {"count", "sum", "mean", "std", "min", "max"}
+        if unknown:
+            raise ValueError(f"Unknown aggregation function(s): {sorted(unknown)}")
+        if cols is None:
+            cols = [_col["key"] for _col in self.header["data"] if _col["key"] != key]
+            cols = [_col for _col in cols if self._is_numeric_scalar(_col)]
+        for col in cols:
+            if not self._is_numeric_scalar(col):
+                raise ValueError(f"Field '{col}' is not a numeric scalar field.")
+
+        stats = ["count"] + [f"{col}_{stat}" for col in cols for stat in _AGGREGATORS]
+        buckets, total = numpy.empty(0, dtype=numpy.int64), {}
+        mm = self._map()
+        try:
+            nrecords = len(mm) // self.record_size
+            for chunk_start in range(0, nrecords, records_per_chunk):
+                index = slice(chunk_start, chunk_start + records_per_chunk)
+                timestamps = numpy.asarray(self._field_values(mm, key)[index])
+                ids = numpy.floor(timestamps / bucket).astype(numpy.int64)
+                chunk = {"count": numpy.ones(len(ids))}
+                for col in cols:
+                    values = numpy.asarray(self._field_values(mm, col)[index], float)
+                    for stat, (transform, _) in _AGGREGATORS.items():
+                        chunk[f"{col}_{stat}"] = transform(values)
+                    del values  # Release the buffer, so that the mmap can be closed.
+                del timestamps
+                ids = numpy.concatenate([buckets, ids])
+                chunk = {
+                    stat: numpy.concatenate([total.get(stat, []), chunk[stat]])
+                    for stat in stats
+                }
+                buckets, total = self._reduce_buckets(ids, chunk, cols)
+        finally:
+            mm.close()
+
+        result = {key: buckets * bucket}
+        count = total.get("count", numpy.empty(0))
+        for col in cols:
+            m2 = numpy.asarray(total.get(f"{col}_m2", []), float)
+            values = {
+                "count": count.astype(numpy.int64),
+                "sum": numpy.asarray(total.get(f"{col}_sum", []), float),
+                "mean": numpy.asarray(total.get(f"{col}_mean", []), float),
+                "std": numpy.sqrt(
+                    m2 / numpy.where(count > ddof, count - ddof, numpy.nan)
+                ),
+                "min": numpy.asarray(total.get(f"{col}_min", []), float),
+                "max": numpy.asarray(total.get(f"{col}_max", []), float),
+            }
+            for func in funcs:
+                result[f"{col}_{func}"] = values[func]
+
+        if astype in ["dict"]:
+            return result
+        elif astype in ["structuredarray", "structured_array", "array", "sa"]:
+            return pandas.DataFrame(result).to_records(index=False)
+        elif astype in ["dataframe", "data_frame", "pandas", "df"]:
+            return pandas.DataFrame(result)
+        raise ValueError(f"Unknown return type {astype}.")
+
+    def _is_numeric_scalar(self, key: str) -> bool:
+        """Whether the field holds a single number per record."""
+        cols = [_col for _col in self.header["data"] if _col["key"] == key]
+        if not cols:
+            raise ValueError(f"Table '{self._name}' has no field '{key}'.")
+        dtype = self._structured_dtype(cols).fields[key][0]
+        return (dtype.ndim == 0) and (dtype.kind in "biuf")
+
+    @staticmethod
+    def _reduce_buckets(
+        ids: numpy.ndarray, stats: Dict[str, numpy.ndarray], cols: List[str]
+    ) -> Tuple[numpy.ndarray, Dict[str, numpy.ndarray]]:
+        """Merge partial statistics which belong to the same bucket."""
+        order = numpy.argsort(ids, kind="stable")
+        ids = ids[order]
+        if len(ids) == 0:
+            return ids, stats
+        boundaries = numpy.flatnonzero(numpy.diff(ids, prepend=ids[0] - 1))
+        groups = numpy.repeat(
+            numpy.arange(len(boundaries)), numpy.diff(boundaries, append=len(ids))
+        )
+        count = stats["count"][order]
+        merged = {"count": numpy.add.reduceat(count, boundaries)}
+        for col in cols:
+            for stat in ["sum", "min", "max"]:
+                ufunc = _AGGREGATORS[stat][1]
+                merged[f"{col}_{stat}"] = ufunc.reduceat(
+                    stats[f"{col}_{stat}"][order], boundaries
+                )
+            # Shift by the first mean in the bucket, to keep the deviations small.
+            means = stats[f"{col}_mean"][order]
+            shifted = means - means[boundaries][groups]
+            mean = means[boundaries] + (
+                numpy.add.reduceat(count * shifted, boundaries) / merged["count"]
+            )
+            deviation = means - mean[groups]
+            merged[f"{col}_mean"] = mean
+            merged[f"{col}_m2"] = numpy.add.reduceat(
+                stats[f"{col}_m2"][order] + count * deviation**2, boundaries
+            )
+        return ids[boundaries], merged
+
+    def view(self) -> numpy.ndarray:
+        """Memory-mapped structured array of the table.
+
+        The array is kept and reused across calls, and is remapped only when the size
+        of the data file has changed, so indexing into it costs nothing but page
+        faults. Slicing it doesn't copy the data, though fancy indexing does, as usual
+        for numpy arrays.
+
+        Examples
+        --------
+        >>> table = db.open_table("topic_name")
+        >>> table.view()["timestamp"][-10:]
+        memmap([...])
+
+        """
+        if (self.layout == "column") or (self.compression is not None):
+            raise ValueError(
+                "Column-major or compressed table cannot be viewed as a structured "
+                "array, use read() or iter_chunks() instead."
+            )
+        data_path = self.dbpath / (self._name + ".data")
+        stat = data_path.stat()
+        nrecords = stat.st_size // self.record_size
+        if (self._view is None) or (len(self._view) != nrecords):
+            dtype = self._structured_dtype(self.header["data"], self.record_size)
+            data_field = [
+                col["key"] for col in self.header["data"] if "x" not in col["format"]
+            ]
+            if nrecords == 0:  # Empty file cannot be memory-mapped
+                self._view = numpy.empty(0, dtype=dtype)[data_field]
+            elif isinstance(data_path, ArchivePath):
+                size = nrecords * self.record_size
+                self._view = data_path.memmap()[:size].view(dtype)[data_field]
+            else:
+                self._view = numpy.memmap(
+                    data_path, dtype=dtype, mode="r", shape=(nrecords,)
+                )[data_field]
+            self.stat = stat
+            self.nrecords = nrecords
+        return self._view
+
+    def time_range(self, t0: float, t1: float, key: str = "time") -> Tuple[int, int]:
+        """Find the record index bounds of the records within a time range.
+
+        Parameters
+        ----------
+        t0: float
+            Lower bound of the time range, inclusive.
+        t1: float
+            Upper bound of the time range, inclusive.
+        key: str
+            Name of the timestamp field.
+
+        Returns
+        -------
+        start, stop
+            Records ``start`` to ``stop - 1`` are the ones in the range. When the
+            timestamps are not monotonic, these are the bounds of the first and the last
+            record in the range, and the records in between may not all be in it.
+
+        Examples
+        --------
+        >>> start, stop = table.time_range(1630042892, 1630042952)
+        >>> other_table.read(start=start, num=stop - start)
+
+        """
+        mm = self._map()
+        timestamps = self._field_values(mm, key)
+        if self._is_monotonic(timestamps, key):
+            start = bisect.bisect_left(timestamps, t0)
+            stop = bisect.bisect_right(timestamps, t1, lo=start)
         else:
-            if isinstance(cols, str):
-                raise ValueError("Column names should be given as list of str.")
-            data = self._read_specified_cols(mm, num, cols)
+            timestamps = timestamps[:]
+            (matched,) = numpy.nonzero((t0 <= timestamps) & (timestamps <= t1))
+            start, stop = (matched[0], matched[-1] + 1) if matched.size else (0, 0)
+        del timestamps  # Release the buffer, so that the mmap can be closed.
+        mm.close()
+        return int(start), int(stop)
+
+    def read_time_range(
+        self,
+        t0: float,
+        t1: float,
+        key: str = "time",
+        cols: List[str] = [],
+        astype: str = "tuple",
+    ) -> Tuple[
+        Union[tuple, dict, numpy.ndarray, pandas.DataFrame, bytes], Tuple[int, int]
+    ]:
+        """Read the records within a time range.
+
+        Parameters
+        ----------
+        t0: float
+            Lower bound of the time range, inclusive.
+        t1: float
+            Upper bound of the time range, inclusive.
+        key: str
+            Name of the timestamp field.
+        cols: list of str
+            Names of the fields to be picked up (e.g. "timestamp").
+        astype: str
+            Return type, see ``read``.
+
+        Returns
+        -------
+        data
+            Records in the range.
+        (start, stop)
+            Record index bounds of the range, see ``time_range``.
+
+        Notes
+        -----
+        The timestamps are binary searched if they are monotonically increasing,
+        otherwise all of them are compared to the range. Whether they are monotonic or
+        not is checked on the first call, which decompresses all blocks of compressed
+        table once.
+
+        """
+        start, stop = self.time_range(t0, t1, key)
+        index = slice(start, stop)
+        if not self._monotonic[key][1]:
+            mm = self._map()
+            timestamps = self._field_values(mm, key)[index]
+            (index,) = numpy.nonzero((t0 <= timestamps) & (timestamps <= t1))
+            index += start
+            del timestamps
+            mm.close()
+        return self._read(index, cols, astype), (start, stop)
+
+    def query(
+        self,
+        where: Dict[str, Tuple[Optional[float], Optional[float]]],
+        cols: List[str] = [],
+        astype: str = "tuple",
+    ) -> Union[tuple, dict, numpy.ndarray, pandas.DataFrame, bytes]:
+        """Read the records whose fields are within given ranges.
+
+        Parameters
+        ----------
+        where
+            Maps names of scalar fields to their ranges ``(lower, upper)``, both
+            inclusive. None means unbounded.
+        cols: list of str
+            Names of the fields to be picked up (e.g. "timestamp").
+        astype: str
+            Return type, see ``read``.
+
+        Notes
+        -----
+        Blocks whose min/max statistics in the zone map (see ``build_zonemap``) cannot
+        match the ranges are skipped without being read. Fields without statistics
+        are compared record by record.
+
+        Examples
+        --------
+        >>> table.query({"az": (30, 60), "el": (None, 80)}, astype="df")
+
+        """
+        zonemap = self._load_zonemap()
+        mm = self._map()
+        nrecords = len(mm) // self.record_size
+
+        candidates = numpy.array([[0, nrecords]])
+        if zonemap is not None:
+            block_records = zonemap["block_records"]
+            starts = numpy.arange(0, nrecords, block_records)
+            match = numpy.ones(len(starts), dtype=bool)
+            for key, (lower, upper) in where.items():
+                if key not in zonemap["columns"]:
+                    continue
+                # Blocks appended after the zone map was loaded are always candidates
+                n = min(len(starts), len(zonemap["count"]))
+                stats = zonemap["columns"][key]
+                if lower is not None:
+                    match[:n] &= numpy.array(stats["max"][:n], dtype=float) >= lower
+                if upper is not None:
+                    match[:n] &= numpy.array(stats["min"][:n], dtype=float) <= upper
+            starts = starts[match]
+            candidates = numpy.stack(
+                [starts, numpy.minimum(starts + block_records, nrecords)], axis=1
+            )
+
+        index = []
+        for start, stop in candidates:
+            match = numpy.ones(stop - start, dtype=bool)
+            for key, (lower, upper) in where.items():
+                values = self._field_values(mm, key)[start:stop]
+                if lower is not None:
+                    match &= values >= lower
+                if upper is not None:
+                    match &= values <= upper
+                del values  # Release the buffer, so that the mmap can be closed.
+            index.append(numpy.nonzero(match)[0] + start)
+        mm.close()
+
+        index = numpy.concatenate(index) if index else numpy.empty(0, dtype=int)
+        return self._read(index, cols, astype)
+
+    def build_zonemap(
+        self, keys: List[str], block_records: Optional[int] = None
+    ) -> None:
+        """Build per-block min/max statistics of the fields, to skip blocks on query.
+
+        The statistics are kept in ``{name}.zonemap`` file. Once built, they are
+        extended as records are appended to the table, and are brought up to date
+        automatically on query if they became stale.
+
+        Parameters
+        ----------
+        keys
+            Names of numeric scalar fields to be indexed.
+        block_records
+            Number of records in a block. Defaults to the block size of compressed
+            table, 4096 otherwise.
+
+        """
+        if block_records is None:
+            block_records = (self.compression or {}).get("block_records", 4096)
+        for key in keys:
+            if not self._is_numeric_scalar(key):
+                raise ValueError(f"Field '{key}' is not a numeric scalar field.")
+
+        zonemap = {
+            "block_records": block_records,
+            "nrecords": 0,
+            "count": [],
+            "columns": {key: {"min": [], "max": []} for key in keys},
+        }
+        self._update_zonemap(zonemap)
+
+    def iter_chunks(
+        self,
+        records_per_chunk: int = 100000,
+        cols: List[str] = [],
+        astype: str = "tuple",
+        num: int = -1,
+        start: int = 0,
+        t0: Optional[float] = None,
+        t1: Optional[float] = None,
+        key: str = "time",
+    ) -> Iterator[Union[tuple, dict, numpy.ndarray, pandas.DataFrame, bytes]]:
+        """Iterate over the contents of the table, chunk by chunk.
+
+        Only one chunk is decoded at a time, so that tables larger than memory can be
+        processed.
+
+        Parameters
+        ----------
+        records_per_chunk: int
+            Maximum number of records in a chunk.
+        cols: list of str
+            Names of the fields to be picked up (e.g. "timestamp").
+        astype: str
+            Return type of each chunk, see ``read``.
+        num: int
+            Number of records to be read.
+        start: int
+            Index of first record to be read.
+        t0, t1: float, optional
+            If given, only the records with ``t0 <= key <= t1`` are read, see
+            ``read_time_range``.
+        key: str
+            Name of the timestamp field.
+
+        Examples
+        --------
+        >>> for chunk in table.iter_chunks(10000, cols=["timestamp"], astype="sa"):
+        ...     process(chunk)
+
+        """
+        mm = self._map()
+        nrecords = len(mm) // self.record_size
+        stop = nrecords if num == -1 else min(start + num, nrecords)
+
+        monotonic = True
+        if (t0 is not None) or (t1 is not None):
+            t0 = -numpy.inf if t0 is None else t0
+            t1 = numpy.inf if t1 is None else t1
+            _start, _stop = self.time_range(t0, t1, key)
+            start, stop = max(start, _start), min(stop, _stop)
+            monotonic = self._monotonic[key][1]
+
+        try:
+            for chunk_start in range(start, stop, records_per_chunk):
+                index = slice(chunk_start, min(chunk_start + records_per_chunk, stop))
+                if not monotonic:
+                    timestamps = self._field_values(mm, key)[index]
+                    (index,) = numpy.nonzero((t0 <= timestamps) & (timestamps <= t1))
+                    index += chunk_start
+                    del timestamps  # Release the buffer.
+                    if index.size == 0:
+                        continue
+                data = self._read_cols(*self._window(mm, index), cols)
+                yield self._astype(data, cols, astype)
+        finally:
+            mm.close()
+
+    def follow(
+        self,
+        cols: List[str] = [],
+        astype: str = "tuple",
+        start: Optional[int] = None,
+        interval: float = 1.0,
+        timeout: Optional[float] = None,
+        records_per_batch: int = 100000,
+    ) -> Iterator[Union[tuple, dict, numpy.ndarray, pandas.DataFrame, bytes]]:
+        """Iterate over the records appended to the table, as they are written.
+
+        The size of the table is polled, and only the records written since the last
+        batch are decoded, so a partially written record at the end of the file is
+        never returned.
+
+        Parameters
+        ----------
+        cols: list of str
+            Names of the fields to be picked up (e.g. "timestamp").
+        astype: str
+            Return type of each batch, see ``read``.
+        start: int, optional
+            Index of first record to be read. Defaults to the current end of the
+            table, i.e. only new records are yielded.
+        interval: float
+            Polling interval in seconds.
+        timeout: float, optional
+            Stop iteration when the table doesn't grow for this many seconds. Follow
+            forever if None.
+        records_per_batch: int
+            Maximum number of records in a batch.
+
+        Examples
+        --------
+        >>> for batch in table.follow(cols=["timestamp", "data"], astype="df"):
+        ...     update_plot(batch)
+
+        """
+        # Take the end of the table now, not on the first iteration.
+        offset = self._count_records() if start is None else start
+        return self._follow(offset, cols, astype, interval, timeout, records_per_batch)
+
+    def _follow(
+        self,
+        offset: int,
+        cols: List[str],
+        astype: str,
+        interval: float,
+        timeout: Optional[float],
+        records_per_batch: int,
+    ) -> Iterator[Union[tuple, dict, numpy.ndarray, pandas.DataFrame, bytes]]:
+        last_growth = time.monotonic()
+        while True:
+            index, offset = self._follow_index(offset, records_per_batch)
+            if index is not None:
+                last_growth = time.monotonic()
+                yield self._read(index, cols, astype)
+                continue
+            if (timeout is not None) and (time.monotonic() - last_growth > timeout):
+                return
+            time.sleep(interval)
+
+    def afollow(
+        self,
+        cols: List[str] = [],
+        astype: str = "tuple",
+        start: Optional[int] = None,
+        interval: float = 1.0,
+        timeout: Optional[float] = None,
+        records_per_batch: int = 100000,
+    ) -> AsyncIterator[Union[tuple, dict, numpy.ndarray, pandas.DataFrame, bytes]]:
+        """Asynchronous version of ``follow``, which sleeps without blocking the loop.
+
+        Examples
+        --------
+        >>> async for batch in table.afollow(cols=["timestamp"], astype="sa"):
+        ...     await publish(batch)
 
+        """
+        offset = self._count_records() if start is None else start
+        return self._afollow(offset, cols, astype, interval, timeout, records_per_batch)
+
+    async def _afollow(
+        self,
+        offset: int,
+        cols: List[str],
+        astype: str,
+        interval: float,
+        timeout: Optional[float],
+        records_per_batch: int,
+    ) -> AsyncIterator[Union[tuple, dict, numpy.ndarray, pandas.DataFrame, bytes]]:
+        last_growth = time.monotonic()
+        while True:
+            index, offset = self._follow_index(offset, records_per_batch)
+            if index is not None:
+                last_growth = time.monotonic()
+                yield self._read(index, cols, astype)
+                continue
+            if (timeout is not None) and (time.monotonic() - last_growth > timeout):
+                return
+            await asyncio.sleep(interval)
+
+    def _follow_index(
+        self, offset: int, records_per_batch: int
+    ) -> Tuple[Optional[slice], int]:
+        """Select the records appended after ``offset``, and the offset to continue.
+
+        If the table has been shrunk, following restarts from its new end.
+
+        """
+        nrecords = self._count_records()
+        if nrecords < offset:
+            return None, nrecords
+        if nrecords == offset:
+            return None, offset
+        stop = min(nrecords, offset + records_per_batch)
+        return slice(offset, stop), stop
+
+    def _read(
+        self,
+        index: Union[slice, numpy.ndarray],
+        cols: List[str],
+        astype: str,
+    ) -> Union[tuple, dict, numpy.ndarray, pandas.DataFrame, bytes]:
+        """Read the records selected by ``index`` and convert them."""
+        mm = self._map()
+        data = self._read_cols(*self._window(mm, index), cols)
         mm.close()
         return self._astype(data, cols, astype)
 
-    def _read_all_cols(self, mm: mmap.mmap, num: int) -> bytes:
+    def _read_cols(
+        self, mm: mmap.mmap, index: Union[slice, numpy.ndarray], cols: List[str]
+    ) -> bytes:
+        """Read the records selected by ``index``, as raw bytes."""
+        if cols == []:
+            return self._read_all_cols(mm, index)
+        if isinstance(cols, str):
+            raise ValueError("Column names should be given as list of str.")
+        return self._read_specified_cols(mm, index, cols)
+
+    def _read_all_cols(
+        self, mm: Union[mmap.mmap, "_ColumnMap"], index: Union[slice, numpy.ndarray]
+    ) -> bytes:
         """Read all columns of the data table."""
-        if num == -1:
-            size = num
-        else:
-            size = num * self.record_size
-        return mm.read(size)
+        if self.layout == "column":
+            return self._read_specified_cols(
+                mm, index, [col["key"] for col in self.header["data"]]
+            )
+
+        if isinstance(index, slice) and (index.step in [None, 1]):
+            start = index.start * self.record_size
+            stop = None if index.stop is None else index.stop * self.record_size
+            return bytes(mm[start:stop])
+
+        records = numpy.frombuffer(
+            mm, dtype=f"V{self.record_size}", count=len(mm) // self.record_size
+        )
+        data = records[index].tobytes()
+        del records  # Release the buffer, so that the mmap can be closed.
+        return data
 
     def _read_specified_cols(
-        self, mm: mmap.mmap, num: int, cols: List[Dict[str, str]]
+        self,
+        mm: Union[mmap.mmap, "_ColumnMap"],
+        index: Union[slice, numpy.ndarray],
+        cols: List[str],
     ) -> bytes:
         """Read specified columns of the data table.
 
         Notes
         -----
-        The byte count of this function may contain bugs. For data which are not
-        aligned, the count would be correct, but byte count for aligned data is much
-        difficult, hence the implementation may not be perfect.
-        One resolution for this problem would be to read all columns, then drop
-        unnecessary columns.
-
-        """
-        commands = []
-        for _col in self.header["data"]:
-            elemsize = struct.calcsize(_col["format"])
-            if _col["key"] in cols:
-                commands.append({"cmd": "read", "size": elemsize})
-                commands.append({"cmd": "seek", "size": _col["size"] - elemsize})
+        The requested fields are picked out of the memory map as strided views, then
+        copied at once into records laid out as if the table consisted only of those
+        fields. The decoders can therefore rely on the usual alignment rules, even for
+        natively aligned data.
+
+        """
+        fields = [_col for _col in self.header["data"] if _col["key"] in cols]
+        if not fields:
+            return b""
+
+        nrecords = len(mm) // self.record_size
+        count = len(range(nrecords)[index]) if isinstance(index, slice) else len(index)
+        arrays = {key: array[index] for key, array in self._fields(mm, fields).items()}
+        projected = numpy.zeros(count, dtype=self._raw_dtype(fields, packed=True))
+        for key, array in arrays.items():
+            projected[key] = array
+        del arrays  # Release the buffer, so that the mmap can be closed.
+        return projected.tobytes()
+
+    def _fields(
+        self, mm: Union[mmap.mmap, "_ColumnMap"], cols: List[Dict[str, Any]]
+    ) -> Dict[str, numpy.ndarray]:
+        """Raw bytes of the fields over all complete records in ``mm``.
+
+        The fields of row-major table are strided views of the memory map, while the
+        ones of column-major table are the memory maps of column files themselves.
+
+        """
+        if self.layout == "column":
+            return {
+                col["key"]: mm.columns[col["key"]][: mm.nrecords]
+                for col in cols
+                if col["key"] in mm.columns  # Pad fields are not stored.
+            }
+
+        records = numpy.frombuffer(
+            mm, dtype=self._raw_dtype(cols), count=len(mm) // self.record_size
+        )
+        return {col["key"]: records[col["key"]] for col in cols}
+
+    def _raw_dtype(
+        self, cols: List[Dict[str, Any]], packed: bool = False
+    ) -> numpy.dtype:
+        """Data type which maps raw bytes of the fields in the records.
+
+        Parameters
+        ----------
+        cols
+            Fields to be mapped.
+        packed
+            If True, the fields are laid out as if the table consisted only of these
+            fields. Otherwise they are placed at their offsets in the records of the
+            table.
+
+        """
+        keys = [_col["key"] for _col in cols]
+        if packed:
+            return RecordLayout.of(cols, self.endian).raw_dtype()
+        return RecordLayout.of(self.header["data"], self.endian).raw_dtype(keys)
+
+    def _field_view(
+        self, mm: Union[mmap.mmap, "_ColumnMap"], key: str
+    ) -> numpy.ndarray:
+        """View of a scalar field over all complete records in ``mm``."""
+        cols = [_col for _col in self.header["data"] if _col["key"] == key]
+        if not cols:
+            raise ValueError(f"Table '{self._name}' has no field '{key}'.")
+
+        dtype = self._structured_dtype(cols).fields[key][0]
+        if dtype.ndim > 0:
+            raise ValueError(f"Field '{key}' is not a scalar field.")
+        return self._fields(mm, cols)[key].view(dtype)
+
+    def _map(self) -> Union[mmap.mmap, "_ColumnMap", "_BlockMap"]:
+        """Map the data file(s) of the table into memory."""
+        if self.layout == "column":
+            return _ColumnMap(self._column_paths(), self.record_size)
+        if self.compression is not None:
+            return _BlockMap(self)
+        # Only complete records are mapped, excluding torn tail left by a crash.
+        data_path = self.dbpath / (self._name + ".data")
+        if isinstance(data_path, ArchivePath):
+            data = data_path.memmap()
+            return data[: len(data) - len(data) % self.record_size].view(_MemberMap)
+        with data_path.open("rb") as data_file:
+            size = os.fstat(data_file.fileno()).st_size
+            size -= size % self.record_size
+            if size == 0:  # Empty file cannot be memory-mapped
+                return numpy.empty(0, dtype=numpy.uint8).view(_MemberMap)
+            return mmap.mmap(data_file.fileno(), size, prot=mmap.PROT_READ)
+
+    def _window(
+        self,
+        mm: Union[mmap.mmap, "_ColumnMap", "_BlockMap"],
+        index: Union[slice, numpy.ndarray],
+    ) -> Tuple[Union[mmap.mmap, "_ColumnMap", bytes], Union[slice, numpy.ndarray]]:
+        """Narrow the mapped data down to the records selected by ``index``.
+
+        Block-compressed tables are decompressed only for the blocks containing the
+        selected records, and the index is shifted to match the decompressed data.
+        Other tables are returned as they are.
+
+        """
+        if self.compression is None:
+            return mm, index
+        if isinstance(index, slice):
+            start, stop, step = index.indices(mm.nrecords)
+            if start >= stop:
+                return b"", slice(0, 0)
+            first, data = mm.window(start, stop)
+            return data, slice(start - first, stop - first, step)
+        if len(index) == 0:
+            return b"", index
+        first, data = mm.window(int(index.min()), int(index.max()) + 1)
+        return data, index - first
+
+    def _field_values(
+        self, mm: Union[mmap.mmap, "_ColumnMap", "_BlockMap"], key: str
+    ) -> Union[numpy.ndarray, "_BlockField"]:
+        """Values of a scalar field, which support binary search and slicing."""
+        if self.compression is not None:
+            return _BlockField(self, mm, key)
+        return self._field_view(mm, key)
+
+    def _read_block_index(self, complete: bool = True) -> numpy.ndarray:
+        """Read the block index of block-compressed table.
+
+        Parameters
+        ----------
+        complete
+            If True, the entries of the blocks whose data are missing (left by an
+            interrupted write) are excluded.
+
+        """
+        index_path = self.dbpath / (self._name + ".index")
+        index = _block_index(index_path.read_bytes())
+        if not complete:
+            return index
+        data_size = (self.dbpath / (self._name + ".data")).stat().st_size
+        return index[: _complete_blocks(index, data_size)]
+
+    def _write_blocks(self, partial: bool = False) -> None:
+        """Compress and write the records pending in the current block.
+
+        Parameters
+        ----------
+        partial
+            If True, the last block is written even if it's not full. It will be
+            rewritten once more records are appended, see ``_rewrite_block``.
+
+        """
+        block_size = self.compression["block_records"] * self.record_size
+        while (len(self._block_pending) >= block_size) or (
+            partial and self._block_pending
+        ):
+            block = bytes(self._block_pending[:block_size])
+            compressed = self._codec.compress(block)
+            entry = numpy.array(
+                [(0, len(compressed), len(block) // self.record_size)],
+                dtype=BLOCK_INDEX_DTYPE,
+            )
+            self.data_file.flush()
+            self._index_file.flush()
+            if self._block_rewrite is not None:
+                offset, position = self._block_rewrite
+                self._rewrite_block(offset, position, compressed, entry)
             else:
-                commands.append({"cmd": "seek", "size": _col["size"]})
+                offset = os.fstat(self.data_file.fileno()).st_size
+                position = self._nblocks
+                entry["offset"] = offset
+                self.data_file.write(compressed)
+                self._index_file.write(entry.tobytes())
+                self._nblocks += 1
+            self._block_rewrite = None
+            if len(block) < block_size:
+                self._block_rewrite = (offset, position)
+                break
+            del self._block_pending[:block_size]
+
+    def _rewrite_block(
+        self, offset: int, position: int, compressed: bytes, entry: numpy.ndarray
+    ) -> None:
+        """Replace the last block, so that the index always points to valid data.
 
-        if num == -1:
-            num = (mm.size() - mm.tell()) // self.record_size
+        The new block is first written past the current one, and the index entry is
+        pointed to it. Then it's moved to the place of the current one, and the data
+        file is truncated after the index entry has been pointed back.
 
-        draw = b""
-        for _ in range(num):
-            for _cmd in commands:
-                if _cmd["cmd"] == "seek":
-                    mm.seek(_cmd["size"], os.SEEK_CUR)
-                else:
-                    draw += mm.read(_cmd["size"])
-        return draw
+        """
+        data_path = self.dbpath / (self._name + ".data")
+        index_path = self.dbpath / (self._name + ".index")
+        # Positional writes are ignored on files opened for appending, so use other
+        # file descriptors.
+        data_fd = os.open(data_path, os.O_WRONLY)
+        index_fd = os.open(index_path, os.O_WRONLY)
+        try:
+            end = os.fstat(data_fd).st_size
+            for _offset in [max(end, offset + len(compressed)), offset]:
+                os.pwrite(data_fd, compressed, _offset)
+                entry["offset"] = _offset
+                os.pwrite(index_fd, entry.tobytes(), position * entry.itemsize)
+            os.ftruncate(data_fd, offset + len(compressed))
+        finally:
+            os.close(data_fd)
+            os.close(index_fd)
+
+    def _inspect_tail(self) -> Tuple[int, int]:
+        """Find the damage left by interrupted writes, from the file sizes.
+
+        Returns
+        -------
+        Number of bytes following the last complete record (or block index entry),
+        and number of blocks whose index entries exist but data don't.
+
+        """
+        if self.layout == "column":
+            sizes = [
+                (path.stat().st_size, size)
+                for path, size in self._column_paths().values()
+            ]
+            nrecords = min([total // size for total, size in sizes], default=0)
+            return sum(total - nrecords * size for total, size in sizes), 0
+        if self.compression is not None:
+            index = self._read_block_index(complete=False)
+            index_size = (self.dbpath / (self._name + ".index")).stat().st_size
+            complete = _complete_blocks(index, self.stat.st_size)
+            end = 0
+            if complete > 0:
+                end = int(index["offset"][complete - 1] + index["size"][complete - 1])
+            torn = (index_size % BLOCK_INDEX_DTYPE.itemsize) + self.stat.st_size - end
+            return torn, len(index) - complete
+        return self.stat.st_size % self.record_size, 0
+
+    def _repair_tail(self) -> None:
+        """Remove the damage found by ``_inspect_tail``, so that appends can resume.
+
+        Incomplete records and blocks are truncated, or the incomplete record of
+        row-major table is padded with null bytes if the repair policy is "pad". The
+        indices of padded records are kept in ``{name}.padded`` file.
+
+        """
+        if self._repair_policy is None:
+            self.data_file.close()
+            raise Exception(
+                f"Table '{self._name}' has a torn tail ({self.torn_bytes} bytes, "
+                f"{self.lost_blocks} blocks), which may be left by an interrupted "
+                "write or the data format may be wrongly specified; open it with "
+                'repair="truncate" or "pad" to append to it anyway.'
+            )
+        data_path = self.dbpath / (self._name + ".data")
+        if self.layout == "column":
+            paths = self._column_paths()
+            nrecords = min(
+                [path.stat().st_size // size for path, size in paths.values()],
+                default=0,
+            )
+            for path, size in paths.values():
+                os.truncate(path, nrecords * size)
+        elif self.compression is not None:
+            index_path = self.dbpath / (self._name + ".index")
+            index = self._read_block_index()
+            end = int(index["offset"][-1] + index["size"][-1]) if len(index) else 0
+            os.truncate(index_path, len(index) * BLOCK_INDEX_DTYPE.itemsize)
+            os.truncate(data_path, end)
+        elif self._repair_policy == "pad":
+            # Extending by truncate pads with null bytes regardless of file position.
+            os.truncate(data_path, (self.nrecords + 1) * self.record_size)
+            padded = self.padded_records + [self.nrecords]
+            with (self.dbpath / (self._name + ".padded")).open("w") as f:
+                json.dump(padded, f)
+        else:
+            os.truncate(data_path, self.nrecords * self.record_size)
+
+    @property
+    def padded_records(self) -> List[int]:
+        """Indices of the incomplete records which were padded on repair."""
+        try:
+            with (self.dbpath / (self._name + ".padded")).open("r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return []
+
+    def _column_paths(self) -> Dict[str, Tuple[pathlib.Path, int]]:
+        """Paths to the column files and the sizes of their elements."""
+        column_dir = self.dbpath / (self._name + ".columns")
+        return {
+            col["key"]: (
+                column_dir / (col["key"] + ".data"),
+                struct.calcsize(self.endian + col["format"]),
+            )
+            for col in self.header["data"]
+            if "x" not in col["format"]
+        }
+
+    def _load_zonemap(self) -> Optional[Dict[str, Any]]:
+        """Load the zone map, bringing it up to date if it's stale."""
+        if not self._zonemap_path.exists():
+            return None
+        with self._zonemap_path.open("r") as f:
+            zonemap = json.load(f)
+
+        nrecords = self._count_records()
+        if (zonemap["nrecords"] != nrecords) or (
+            zonemap.get("fingerprint") != self._records_crc(nrecords)
+        ):
+            zonemap = self._update_zonemap(zonemap)
+        return zonemap
+
+    def _records_crc(self, nrecords: int) -> int:
+        """CRC32 of the records preceding ``nrecords``, up to a fixed length.
+
+        Kept with the statistics derived from the records, to tell if the records
+        have been rewritten since then.
+
+        """
+        if nrecords == 0:
+            return 0
+        start = max(
+            nrecords - max(CHECKOUT_FINGERPRINT_BYTES // self.record_size, 1), 0
+        )
+        mm = self._map()
+        try:
+            return zlib.crc32(
+                self._read_cols(*self._window(mm, slice(start, nrecords)), [])
+            )
+        finally:
+            mm.close()
+
+    def _count_records(self) -> int:
+        """Number of records currently stored, including ones by other writers."""
+        if self.layout == "column":
+            return _ColumnMap(self._column_paths(), self.record_size).nrecords
+        if self.compression is not None:
+            return int(self._read_block_index()["nrecords"].sum())
+        data_path = self.dbpath / (self._name + ".data")
+        return data_path.stat().st_size // self.record_size
+
+    def _update_zonemap(
+        self, zonemap: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """Extend the zone map to cover the records appended since the last update.
+
+        Statistics of the last incomplete block are recomputed. If the table has been
+        shrunk or the records covered by the zone map have been rewritten, the zone
+        map is rebuilt from scratch.
+
+        """
+        if zonemap is None:
+            with self._zonemap_path.open("r") as f:
+                zonemap = json.load(f)
+
+        nrecords = self._count_records()
+        block_records = zonemap["block_records"]
+        if (zonemap["nrecords"] > nrecords) or (
+            zonemap.get("fingerprint") != self._records_crc(zonemap["nrecords"])
+        ):
+            zonemap["nrecords"] = 0
+        first = zonemap["nrecords"] // block_records * block_records
+
+        nblocks = first // block_records
+        zonemap["count"] = zonemap["count"][:nblocks]
+        offsets = numpy.arange(0, nrecords - first, block_records)
+        zonemap["count"] += numpy.diff(offsets, append=nrecords - first).tolist()
+        mm = self._map() if nrecords > first else None
+        for key, stats in zonemap["columns"].items():
+            for stat in ["min", "max"]:
+                stats[stat] = stats[stat][:nblocks]
+            if mm is None:
+                continue
+            values = numpy.asarray(self._field_values(mm, key)[first:nrecords])
+            stats["min"] += numpy.fmin.reduceat(values, offsets).tolist()
+            stats["max"] += numpy.fmax.reduceat(values, offsets).tolist()
+            del values  # Release the buffer, so that the mmap can be closed.
+        if mm is not None:
+            mm.close()
+        zonemap["nrecords"] = nrecords
+        zonemap["fingerprint"] = self._records_crc(nrecords)
+
+        try:
+            tmp_path = self._zonemap_path.with_suffix(".zonemap.tmp")
+            with tmp_path.open("w") as f:
+                json.dump(zonemap, f)
+            os.replace(tmp_path, self._zonemap_path)
+        except OSError:  # Read-only database, use the statistics without saving
+            pass
+        self._zonemap_unindexed = 0
+        return zonemap
+
+    def _is_monotonic(self, values: numpy.ndarray, key: str) -> bool:
+        """Check if the field is monotonically increasing.
+
+        The result is cached, so that only records appended after the last check are
+        examined.
+
+        """
+        checked, monotonic = self._monotonic.get(key, (0, True))
+        if monotonic and (len(values) > checked):
+            tail = values[max(0, checked - 1) :]
+            monotonic = bool((tail[1:] >= tail[:-1]).all())
+        self._monotonic[key] = (len(values), monotonic)
+        return monotonic
 
     def _astype(
         self, data: bytes, cols: List[Dict[str, Any]], astype: str
@@ -367,6 +2317,29 @@ class table:
             cols = self.header["data"]
         else:
             cols = [_col for _col in self.header["data"] if _col["key"] in cols]
+            # Projected data are packed as if the table consisted only of these
+            # columns, so the sizes (which include alignment) should be recomputed.
+            sizes = RecordLayout.of(cols, self.endian).sizes
+            cols = [dict(_col, size=size) for _col, size in zip(cols, sizes)]
+
+        if self.stats is None:
+            return self._convert(data, cols, astype)
+        started = time.perf_counter()
+        converted = self._convert(data, cols, astype)
+        record_size = RecordLayout.of(cols, self.endian).size
+        self._record(
+            "decode",
+            started,
+            bytes_read=len(data),
+            records=len(data) // record_size if record_size else 0,
+            astype=astype,
+        )
+        return converted
+
+    def _convert(
+        self, data: bytes, cols: List[Dict[str, Any]], astype: str
+    ) -> Union[tuple, dict, numpy.ndarray, pandas.DataFrame, bytes]:
+        """Convert the records of the columns into the return type."""
 
         def DataFormatError(e: Union[Exception, str] = ""):
             return ValueError(
@@ -384,7 +2357,7 @@ class table:
         elif astype in ["dict"]:
             try:
                 return self._astype_dict(data, cols)
-            except struct.error as e:
+            except ValueError as e:
                 raise DataFormatError(e)
 
         elif astype in ["structuredarray", "structured_array", "array", "sa"]:
@@ -396,7 +2369,7 @@ class table:
         elif astype in ["dataframe", "data_frame", "pandas", "df"]:
             try:
                 return self._astype_data_frame(data, cols)
-            except struct.error as e:
+            except ValueError as e:
                 raise DataFormatError(e)
 
         elif astype in ["buffer", "raw"]:
@@ -409,70 +2382,104 @@ class table:
         self, data: bytes, cols: List[Dict[str, Any]]
     ) -> Tuple[Tuple[Any]]:
         """Read the data as tuple of tuple."""
-        fmt = self.endian + "".join([col["format"] for col in cols])
-        return tuple(struct.iter_unpack(fmt, data))
+        return tuple(RecordLayout.of(cols, self.endian).struct.iter_unpack(data))
 
     def _astype_dict(
         self, data: bytes, cols: List[Dict[str, Any]]
     ) -> List[Dict[str, Any]]:
         """Read the data as list of dict."""
-        offset = 0
-        dictlist = []
-        while offset < len(data):
-            dict_ = {}
-
-            for col in cols:
-                size = struct.calcsize(col["format"])
-                if "x" in col["format"]:  # Pad field
-                    offset += col["size"]
-                    continue
-                dat = struct.unpack(col["format"], data[offset : offset + size])
-                if len(dat) == 1:
-                    (dat,) = dat
-
-                dict_[col["key"]] = dat
-                offset += col["size"]
-
-            dictlist.append(dict_)
-
-        return dictlist
+        columns = self._decode_columns(self._astype_structured_array(data, cols))
+        keys = list(columns.keys())
+        return [dict(zip(keys, row)) for row in zip(*columns.values())]
 
     def _astype_data_frame(
         self, data: bytes, cols: List[Dict[str, Any]]
     ) -> pandas.DataFrame:
         """Read the data as pandas.DataFrame."""
-        data = self._astype_dict(data, cols)
-        return pandas.DataFrame.from_dict(data)
-
-    def _astype_structured_array(
-        self, data: bytes, cols: List[Dict[str, Any]]
-    ) -> numpy.ndarray:
-        """Read the data as numpy's structured array."""
-        formats = [col["format"] for col in cols]
+        return self._data_frame(self._astype_structured_array(data, cols))
 
-        def parse_dtype(format_character: str) -> str:
-            def str_format(length: Union[str, int], count: Union[str, int]):
-                count = count if int(count) > 1 else ""
-                return f"{count}S{length}"
-
-            format_character = re.sub(
-                r"^([\d+s]+)$",
-                lambda m: str_format(m.group(1).split("s")[0], m.group(1).count("s")),
-                format_character,
-            )
+    def _data_frame(
+        self, array: numpy.ndarray, expand_arrays: bool = False
+    ) -> pandas.DataFrame:
+        """Convert structured array into pandas.DataFrame, see ``_decode_columns``."""
+        columns = self._decode_columns(array, native=True, expand_arrays=expand_arrays)
+        return pandas.DataFrame(columns, columns=list(columns.keys()))
+
+    def _decode_columns(
+        self,
+        array: numpy.ndarray,
+        native: bool = False,
+        expand_arrays: bool = False,
+    ) -> Dict[str, Union[list, numpy.ndarray]]:
+        """Decode the fields of structured array column by column.
 
-            format_character = format_character.replace("x", "V")
-            return self.endian + format_character
+        Parameters
+        ----------
+        native
+            If True, numeric fields are kept as numpy arrays in native byte order,
+            widened to 64-bit as they would be if converted via Python objects,
+            instead of being converted to lists of Python objects.
+        expand_arrays
+            If True, elements of array fields are given their own columns, named
+            ``{key}_{i}``. Otherwise array fields are converted to tuples.
 
-        np_formats = [parse_dtype(col["format"]) for col in cols]
-        keys = [col["key"] for col in cols]
-        offsets = utils.get_struct_indices(formats, self.endian)[:-1]
+        Notes
+        -----
+        String fields keep their trailing null bytes, as ``struct`` does.
 
-        pad = ["x" in col["format"] for col in cols]
-        data_field = [k for k, p in zip(keys, pad) if not p]
+        """
+        columns = {}
+        for key in array.dtype.names:
+            values = array[key]
+            numeric = values.dtype.kind in "biuf"
+            if expand_arrays and (values.ndim > 1):
+                flat = values.reshape(len(values), int(numpy.prod(values.shape[1:])))
+                for i in range(flat.shape[1]):
+                    column = flat[:, i]
+                    if column.dtype.kind == "S":
+                        column = column.view(f"V{column.dtype.itemsize}").tolist()
+                    elif native and numeric:
+                        column = _widen(column)
+                    else:
+                        column = column.tolist()
+                    columns[f"{key}_{i}"] = column
+                continue
+            if values.dtype.kind == "S":
+                values = values.view(f"V{values.dtype.itemsize}").tolist()
+            elif native and numeric and (values.ndim == 1):
+                columns[key] = _widen(values)
+                continue
+            else:
+                values = values.tolist()
+            if values and (array.dtype[key].ndim > 0):
+                values = list(map(tuple, values))
+            columns[key] = values
+        return columns
+
+    def _structured_dtype(
+        self, cols: List[Dict[str, Any]], itemsize: Optional[int] = None
+    ) -> numpy.dtype:
+        """Numpy's structured data type equivalent to the format of ``cols``."""
+        dtype = RecordLayout.of(cols, self.endian).dtype
+        if (itemsize is None) or (itemsize == dtype.itemsize):
+            return dtype
+        fields = dict(dtype.fields)
+        return numpy.dtype(
+            {
+                "names": list(dtype.names),
+                "formats": [fields[key][0] for key in dtype.names],
+                "offsets": [fields[key][1] for key in dtype.names],
+                "itemsize": itemsize,
+            }
+        )
 
-        dtype = numpy.dtype({"names": keys, "formats": np_formats, "offsets": offsets})
-        return numpy.frombuffer(data, dtype=dtype)[data_field]
+    def _astype_structured_array(
+        self, data: bytes, cols: List[Dict[str, Any]]
+    ) -> numpy.ndarray:
+        """Read the data as numpy's structured array."""
+        record_layout = RecordLayout.of(cols, self.endian)
+        records = numpy.frombuffer(data, dtype=record_layout.dtype)
+        return records[record_layout.data_keys]
 
     @property
     def recovered(self) -> "table":
@@ -497,7 +2504,323 @@ class table:
         return recover(self)
 
 
-def opendb(path: os.PathLike, mode: str = "r") -> "necstdb":
+class _ColumnMap:
+    """Memory maps of the column files of a column-major table.
+
+    Parameters
+    ----------
+    paths
+        Maps field names to the paths to their column files and the sizes of their
+        elements.
+    record_size
+        Size of a record, if the table were row-major.
+
+    """
+
+    def __init__(
+        self, paths: Dict[str, Tuple[pathlib.Path, int]], record_size: int
+    ) -> None:
+        self.columns = {}
+        for key, (path, elemsize) in paths.items():
+            count = path.stat().st_size // elemsize
+            if count == 0:  # Empty file cannot be memory-mapped
+                self.columns[key] = numpy.empty(0, dtype=f"V{elemsize}")
+            elif isinstance(path, ArchivePath):
+                self.columns[key] = path.memmap()[: count * elemsize].view(
+                    f"V{elemsize}"
+                )
+            else:
+                self.columns[key] = numpy.memmap(
+                    path, dtype=f"V{elemsize}", mode="r", shape=(count,)
+                )
+        self.nrecords = min(map(len, self.columns.values()), default=0)
+        self.record_size = record_size
+
+    def __len__(self) -> int:
+        """Size of the table in bytes, if it were row-major."""
+        return self.nrecords * self.record_size
+
+    def close(self) -> None:
+        """Release the memory maps."""
+        self.columns = {}
+
+
+class _MemberMap(numpy.ndarray):
+    """Bytes of a member of archived database (or of empty file), used in place of
+    ``mmap``."""
+
+    def close(self) -> None:
+        """Nothing to release, the memory map is closed with the array."""
+
+
+class _BlockMap:
+    """Compressed blocks of a block-compressed table, decompressed on demand.
+
+    Decompressed blocks are kept in the bounded cache of the table, and missing ones
+    are decompressed in parallel, since the codecs release the GIL.
+
+    Parameters
+    ----------
+    table
+        The block-compressed table.
+
+    """
+
+    def __init__(self, table: "table") -> None:
+        self.table = table
+        self.index = table._read_block_index()
+        self.starts = numpy.concatenate([[0], numpy.cumsum(self.index["nrecords"])])
+        self.nrecords = int(self.starts[-1])
+        self.data_file = (table.dbpath / (table._name + ".data")).open("rb")
+
+    def __len__(self) -> int:
+        """Size of the table in bytes, if it were not compressed."""
+        return self.nrecords * self.table.record_size
+
+    def window(self, start: int, stop: int) -> Tuple[int, bytes]:
+        """Decompress the blocks containing records ``start`` to ``stop - 1``.
+
+        Returns
+        -------
+        first
+            Index of the first record in the decompressed data.
+        data
+            Decompressed records.
+
+        """
+        first = int(numpy.searchsorted(self.starts, start, side="right")) - 1
+        last = int(numpy.searchsorted(self.starts, stop, side="left"))
+        blocks = list(range(first, last))
+
+        cache = self.table._block_cache
+        keys = {
+            i: tuple(int(x) for x in self.index[i][["offset", "size"]]) for i in blocks
+        }
+        missing = [i for i in blocks if keys[i] not in cache]
+        if len(missing) > 1:
+            with concurrent.futures.ThreadPoolExecutor(
+                self.table.decompress_workers
+            ) as executor:
+                decompressed = dict(
+                    zip(missing, executor.map(self._decompress, missing))
+                )
+        else:
+            decompressed = {i: self._decompress(i) for i in missing}
+
+        data = []
+        for i in blocks:
+            if i in decompressed:
+                cache[keys[i]] = decompressed[i]
+            cache.move_to_end(keys[i])
+            data.append(cache[keys[i]])
+            while len(cache) > self.table.block_cache_size:
+                cache.popitem(last=False)
+        return int(self.starts[first]), b"".join(data)
+
+    def _decompress(self, i: int) -> bytes:
+        """Read and decompress a block."""
+        offset, size, _ = self.index[i]
+        if hasattr(self.data_file, "pread"):  # Member of archived database
+            compressed = self.data_file.pread(int(size), int(offset))
+        else:
+            compressed = os.pread(self.data_file.fileno(), int(size), int(offset))
+        return self.table._codec.decompress(compressed)
+
+    def close(self) -> None:
+        """Close the data file."""
+        self.data_file.close()
+
+
+class _BlockField:
+    """Lazily decompressed values of a scalar field of block-compressed table.
+
+    Single values are decompressed block by block, so that binary search touches only
+    a few blocks. Slices are decompressed as a whole.
+
+    """
+
+    def __init__(self, table: "table", blocks: _BlockMap, key: str) -> None:
+        self.table = table
+        self.blocks = blocks
+        self.key = key
+        self.dtype = table._field_view(b"", key).dtype
+
+    def __len__(self) -> int:
+        return self.blocks.nrecords
+
+    def __getitem__(
+        self, index: Union[int, slice]
+    ) -> Union[numpy.generic, numpy.ndarray]:
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if start >= stop:
+                return numpy.empty(0, dtype=self.dtype)
+            first, data = self.blocks.window(start, stop)
+            values = self.table._field_view(data, self.key)
+            return values[start - first : stop - first : step].copy()
+
+        index = index + len(self) if index < 0 else index
+        first, data = self.blocks.window(index, index + 1)
+        return self.table._field_view(data, self.key)[index - first]
+
+
+def _read_range(
+    path: pathlib.Path,
+    name: str,
+    endian: str,
+    data: List[Dict[str, Any]],
+    index: slice,
+    cols: List[str],
+    astype: str,
+) -> Union[tuple, dict, numpy.ndarray, pandas.DataFrame, bytes]:
+    """Read a range of records of a table, can be pickled to be run in another
+    process."""
+    with warnings.catch_warnings():  # Already warned in the parent process.
+        warnings.simplefilter("ignore")
+        _table = table(path, name, "rb", endian)
+    try:
+        _table.header["data"] = data
+        return _table._read(index, cols, astype)
+    finally:
+        _table.close()
+
+
+def _concat(
+    parts: List[Union[tuple, list, numpy.ndarray, pandas.DataFrame, bytes]],
+) -> Union[tuple, list, numpy.ndarray, pandas.DataFrame, bytes]:
+    """Concatenate the results of reads of consecutive ranges, in order."""
+    if isinstance(parts[0], pandas.DataFrame):
+        return pandas.concat(parts, ignore_index=True)
+    if isinstance(parts[0], numpy.ndarray):
+        return numpy.concatenate(parts)
+    if isinstance(parts[0], bytes):
+        return b"".join(parts)
+    return type(parts[0])(itertools.chain.from_iterable(parts))
+
+
+def _widen(values: numpy.ndarray) -> numpy.ndarray:
+    """Numeric values in native byte order, with the 64-bit types which pandas infers
+    from the equivalent Python objects."""
+    kind = values.dtype.kind
+    if kind == "f":
+        return values.astype(numpy.float64)
+    if (kind == "i") or ((kind == "u") and (values.dtype.itemsize < 8)):
+        return values.astype(numpy.int64)
+    if kind == "u":
+        if (len(values) > 0) and (values.max() > numpy.iinfo(numpy.int64).max):
+            return values.astype(numpy.uint64)
+        return values.astype(numpy.int64)
+    return values.astype(values.dtype.newbyteorder("="))
+
+
+def _tail_crc(path: pathlib.Path, size: int) -> int:
+    """CRC32 of the bytes of the file preceding ``size``, up to a fixed length."""
+    start = max(size - CHECKOUT_FINGERPRINT_BYTES, 0)
+    with path.open("rb") as f:
+        f.seek(start)
+        return zlib.crc32(f.read(size - start))
+
+
+def _block_index(data: bytes) -> numpy.ndarray:
+    """Entries of block index, ignoring incomplete entry at the end."""
+    count = len(data) // BLOCK_INDEX_DTYPE.itemsize
+    return numpy.frombuffer(data, dtype=BLOCK_INDEX_DTYPE, count=count)
+
+
+def _complete_blocks(index: numpy.ndarray, data_size: int) -> int:
+    """Number of leading blocks whose data are within the data file."""
+    ends = index["offset"] + index["size"]
+    return int(numpy.searchsorted(ends, data_size, side="right"))
+
+
+def _read_table(
+    path: pathlib.Path,
+    name: str,
+    endian: str,
+    cols: List[str],
+    astype: str,
+    stats: Optional[Stats] = None,
+) -> Union[tuple, dict, numpy.ndarray, pandas.DataFrame, bytes]:
+    """Read whole contents of a table, can be pickled to be run in another process."""
+    _table = table(path, name, "rb", endian, stats=stats)
+    try:
+        return _table.read(cols=cols, astype=astype)
+    finally:
+        _table.close()
+
+
+class _ParallelCompressor:
+    """Write-only file object, which compresses blocks of the data in parallel.
+
+    The compressed blocks are written in order, keeping a bounded number of blocks in
+    flight.
+
+    Parameters
+    ----------
+    file
+        File object the compressed data are written to.
+    compress
+        Function which compresses a block into a complete stream.
+    block_size
+        Size of the blocks before compression.
+    max_workers
+        Number of compressing threads.
+
+    """
+
+    def __init__(
+        self,
+        file: Any,
+        compress: Callable[[bytes], bytes],
+        block_size: int,
+        max_workers: Optional[int] = None,
+    ) -> None:
+        self.file = file
+        self.compress = compress
+        self.block_size = block_size
+        max_workers = max_workers or os.cpu_count() or 1
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers)
+        self.max_pending = 2 * max_workers
+        self.pending = collections.deque()
+        self.buffer = bytearray()
+        self.blocks = []
+
+    def write(self, data: bytes) -> int:
+        self.buffer += data
+        while len(self.buffer) >= self.block_size:
+            self._submit(bytes(self.buffer[: self.block_size]))
+            del self.buffer[: self.block_size]
+        return len(data)
+
+    def _submit(self, block: bytes) -> None:
+        self.pending.append(self.executor.submit(self.compress, block))
+        while len(self.pending) > self.max_pending:
+            self._write_next()
+
+    def _write_next(self) -> None:
+        """Write the oldest compressed block, recording its offset and size."""
+        compressed = self.pending.popleft().result()
+        offset = self.blocks[-1][0] + self.blocks[-1][1] if self.blocks else 0
+        self.blocks.append((offset, len(compressed)))
+        self.file.write(compressed)
+
+    def close(self) -> None:
+        if self.buffer:
+            self._submit(bytes(self.buffer))
+            self.buffer = bytearray()
+        while self.pending:
+            self._write_next()
+        self.executor.shutdown()
+
+
+def opendb(
+    path: os.PathLike,
+    mode: str = "r",
+    stats: Union[bool, Stats] = False,
+    durability: str = "none",
+    fsync_interval: float = 1.0,
+    lock: bool = False,
+) -> "necstdb":
     """Quick alias to open a database.
 
     Parameters
@@ -506,12 +2829,24 @@ def opendb(path: os.PathLike, mode: str = "r") -> "necstdb":
         Path to the database directory, the direct parent of *.data and *.header files.
     mode: str
         Mode in which the database is opened (e.g. ["rb", "wb", ...]).
+    stats: bool or Stats
+        If True, I/O and decoding of the tables are counted, see ``necstdb.stats``.
+    durability, fsync_interval, lock
+        Durability of the written data, see ``necstdb``.
 
     """
-    return necstdb(path, mode)
-
-
-def relog(db: necstdb, starttime: float, endtime: float):
+    return necstdb(path, mode, stats, durability, fsync_interval, lock)
+
+
+def relog(
+    db: necstdb,
+    starttime: float,
+    endtime: float,
+    saveto: Optional[os.PathLike] = None,
+    key: str = "time",
+    max_workers: Optional[int] = None,
+    records_per_chunk: int = 100000,
+) -> necstdb:
     """Create time-subtracted necstdb.
 
     Parameters
@@ -522,27 +2857,115 @@ def relog(db: necstdb, starttime: float, endtime: float):
         Start subtraction from this time
     endtime: float
         End subtraction from this time
+    saveto: PathLike, optional
+        Path to the new database. Defaults to ``{name of db}_extracted`` in current
+        directory.
+    key: str
+        Name of the timestamp field. Tables without this field are copied entirely.
+    max_workers: int, optional
+        Maximum number of tables processed in parallel.
+    records_per_chunk: int
+        Number of records copied at a time.
+
+    Returns
+    -------
+    The new database.
+
+    Notes
+    -----
+    Records are copied as raw bytes, without being decoded. The record range of each
+    table is found by binary search over the timestamps, if they are monotonically
+    increasing.
 
     """
-    newdb = opendb(db.path.stem + "_extracted", mode="w")
-
-    for name in db.list_tables():
-        print(name)
-        table = db.open_table(name)
-        data = table.read(astype="df")
-        timestamp_key = "time"
-        t = data[timestamp_key].astype(float)
-        idx = t[(starttime <= t) & (t <= endtime)].index
-        extracted_data = data.iloc[idx]
-
-        header = table.header
-        header.pop("struct_indices")
-        newdb.create_table(name, header)
-        newtable = newdb.open_table(name, "wb")
-
-        for row in extracted_data.itertuples(index=False):
-            _data = utils.flatten_data(list(row))
-            newtable.append(*_data)
+    saveto = db.path.stem + "_extracted" if saveto is None else saveto
+    newdb = opendb(saveto, mode="w")
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(
+                _relog_table,
+                db,
+                newdb,
+                name,
+                starttime,
+                endtime,
+                key,
+                records_per_chunk,
+            )
+            for name in db.list_tables()
+        ]
+        _ = [future.result() for future in futures]
 
+    newdb.save_file(
+        "relog.txt",
+        f"{starttime} <= {key} <= {endtime}",
+        f"Extracted from {db.path.resolve()}",
+    )
+    return newdb
+
+
+def restore(archives: Sequence[os.PathLike], path: os.PathLike) -> None:
+    """Extract the archives created by ``necstdb.checkout``, in order.
+
+    Parameters
+    ----------
+    archives
+        Paths to a full archive followed by incremental ones.
+    path
+        Directory the archives are extracted into.
+
+    Examples
+    --------
+    >>> necstdb.restore(["night1.tar.gz", "night1-1.tar.gz"], "restored")
+
+    """
+    path = pathlib.Path(path)
+    for archive in archives:
+        with tarfile.open(archive, mode="r") as tar:
+            for info in tar:
+                if ARCHIVE_OFFSET_KEY not in info.pax_headers:
+                    tar.extract(info, path)
+                    continue
+                offset = int(info.pax_headers[ARCHIVE_OFFSET_KEY])
+                with (path / info.name).open("r+b") as f:
+                    f.truncate(offset)
+                    f.seek(offset)
+                    f.write(tar.extractfile(info).read())
+                os.utime(path / info.name, (info.mtime, info.mtime))
+
+
+def _relog_table(
+    db: necstdb,
+    newdb: necstdb,
+    name: str,
+    starttime: float,
+    endtime: float,
+    key: str,
+    records_per_chunk: int,
+) -> None:
+    """Copy the records of a table within the time range, into another database."""
+    table = db.open_table(name)
+    header = {k: v for k, v in table.header.items() if k not in _DERIVED_HEADER_KEYS}
+    compression = table.compression or {}
+    newdb.create_table(
+        name,
+        header,
+        endian=table.endian,
+        layout=table.layout,
+        compression=compression.get("codec"),
+        block_records=compression.get("block_records", 4096),
+    )
+    newtable = newdb.open_table(name, "ab")
+
+    kwargs = {}
+    if any(_col["key"] == key for _col in table.header["data"]):
+        kwargs = dict(t0=starttime, t1=endtime, key=key)
+    try:
+        if table._count_records() == 0:  # Empty file cannot be memory-mapped
+            return
+        for chunk in table.iter_chunks(records_per_chunk, astype="raw", **kwargs):
+            newtable._write(chunk, len(chunk) // table.record_size)
+    finally:
         newtable.close()
-    newdb.save_file(path=db.path.stem + "_extracted", content="subtracted database")
+        table.close()
@@ -1,7 +1,12 @@
-from typing import TYPE_CHECKING
+import json
+import os
+import re
+from typing import TYPE_CHECKING, Any, Dict, Optional
 
 import numpy
 
+from .layout import RecordLayout
+
 if TYPE_CHECKING:
     from .necstdb import table
 
@@ -16,37 +21,112 @@ def recover(t: "table") -> "table":
             dat["format"] = dat["format"].replace("i", "?")
 
     if "s" in fmt:
+        lengths = _string_lengths(t)
         modified_header_data = []
         for dat in t.header["data"]:
-            if "s" not in dat["format"]:
+            length = lengths.get(dat["key"])
+            specified = _string_length(dat["format"])
+            if (length is None) or (length == specified):
                 modified_header_data.append(dat)
             else:
-                dat_numpy = t.read(astype="sa")
-                this_field = dat_numpy[dat["key"]]
-                lengths = numpy.unique([len(d) for d in this_field])
-                if len(lengths) > 1:  # Not uniform length
-                    modified_header_data.append(dat)
-                else:
-                    (length,) = lengths
-                    specified = int(dat["format"].rstrip("s"))
-                    if length == specified:
-                        modified_header_data.append(dat)
-                    else:
-                        diff = specified - length
-                        modified_header_data.append(
-                            {
-                                "key": dat["key"],
-                                "format": f"{length}s",
-                                "size": length,
-                            }
-                        )
-                        modified_header_data.append(
-                            {
-                                "key": f"_{dat['key']}_pad",
-                                "format": f"{diff}x",
-                                "size": diff,
-                            }
-                        )
+                diff = specified - length
+                modified_header_data.append(
+                    {
+                        "key": dat["key"],
+                        "format": f"{length}s",
+                        "size": length,
+                    }
+                )
+                modified_header_data.append(
+                    {
+                        "key": f"_{dat['key']}_pad",
+                        "format": f"{diff}x",
+                        "size": diff,
+                    }
+                )
         t.header["data"] = modified_header_data
 
+    # Size of records may have changed, e.g. int32 fields recovered as bool.
+    layout = RecordLayout.of(t.header["data"], t.endian)
+    for dat, size in zip(t.header["data"], layout.sizes):
+        dat["size"] = size
+    t.format, t._struct, t.record_size = layout.format, layout.struct, layout.size
+    t.nrecords = t._count_records()
+    t.torn_bytes, t.lost_blocks = t._inspect_tail()
+    t._view = None
     return t
+
+
+def _string_length(format_character: str) -> Optional[int]:
+    """Length of single string format (e.g. "5s"), None for other formats."""
+    match = re.fullmatch(r"(\d*)s", format_character)
+    if match is None:
+        return None
+    return int(match.group(1)) if match.group(1) else 1
+
+
+def _string_lengths(t: "table") -> Dict[str, Optional[int]]:
+    """Uniform lengths of the string fields, excluding trailing null bytes.
+
+    The lengths are scanned once, over all string fields at a time, and are saved in
+    the recovery plan ``{name}.recovery`` file. Subsequent calls scan only the records
+    appended since then, unless the header has been modified or the scanned records
+    have been rewritten.
+
+    Returns
+    -------
+    Maps the names of single string fields to the length which all values have in
+    common, or None if the lengths vary or the table is empty.
+
+    """
+    plan_path = t.dbpath / (t._name + ".recovery")
+    header_stat = (t.dbpath / (t._name + ".header")).stat()
+    header_key = [header_stat.st_mtime_ns, header_stat.st_size]
+    nrecords = t._count_records()
+
+    plan = _load_plan(plan_path)
+    if (
+        (plan is None)
+        or (plan["header"] != header_key)
+        or (plan["endian"] != t.endian)
+        or (plan["nrecords"] > nrecords)
+        or (plan.get("fingerprint") != t._records_crc(plan["nrecords"]))
+    ):
+        plan = {"header": header_key, "endian": t.endian, "nrecords": 0, "lengths": {}}
+
+    cols = [dat for dat in t.header["data"] if _string_length(dat["format"])]
+    if (nrecords > plan["nrecords"]) and cols:
+        mm = t._map()
+        fields = t._fields(mm, cols)
+        for col in cols:
+            values = fields[col["key"]][plan["nrecords"] : nrecords]
+            values = values.view(f"S{values.dtype.itemsize}")
+            lengths = numpy.unique(numpy.char.str_len(values)).tolist()
+            del values  # Release the buffer, so that the mmap can be closed.
+            if plan["nrecords"] > 0:  # Merge with the lengths of scanned records
+                lengths = set(lengths) | {plan["lengths"][col["key"]]}
+            plan["lengths"][col["key"]] = lengths.pop() if len(lengths) == 1 else None
+        del fields
+        mm.close()
+        plan["nrecords"] = nrecords
+        plan["fingerprint"] = t._records_crc(nrecords)
+        _save_plan(plan_path, plan)
+    return plan["lengths"]
+
+
+def _load_plan(path: os.PathLike) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _save_plan(path: os.PathLike, plan: Dict[str, Any]) -> None:
+    try:
+        tmp_path = str(path) + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(plan, f)
+        os.replace(tmp_path, path)
+    except OSError:  # Read-only database, the plan is just not cached.
+        pass
@@ -0,0 +1,107 @@
+"""Opt-in counters of I/O and decoding, for profiling slow loads."""
+
+import collections
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+
+class Stats:
+    """Counters of bytes, records and time spent, with hooks notified on each event.
+
+    Counters of a table are also added to the ones of its database, passed as
+    ``parent``.
+
+    Parameters
+    ----------
+    parent
+        Stats which also accumulates these counters.
+
+    Attributes
+    ----------
+    bytes_read: int
+        Bytes of the records passed to decoders.
+    bytes_written: int
+        Bytes of the records appended.
+    records_decoded: Counter
+        Number of records decoded, per return type.
+    records_written: int
+        Number of records appended.
+    seconds: Counter
+        Time spent in "open", "header" (parsing), "decode", "append", "flush" and
+        "fsync".
+    events: Counter
+        Number of times each of the above happened.
+    hooks: list of callable
+        Called with the name of event (one of the keys of ``seconds``), the name of
+        the table, and the details of the event as a dict.
+
+    Examples
+    --------
+    >>> db = necstdb.opendb("path/to/db", stats=True)
+    >>> db.stats.hooks.append(lambda event, table, info: print(event, table, info))
+    >>> data = db.open_table("data1").read(astype="df")
+    >>> db.stats.as_dict()
+
+    """
+
+    def __init__(self, parent: Optional["Stats"] = None) -> None:
+        self.parent = parent
+        self.hooks: List[Callable[[str, str, Dict[str, Any]], None]] = []
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """Zero all counters."""
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.records_decoded = collections.Counter()
+        self.records_written = 0
+        self.seconds = collections.Counter()
+        self.events = collections.Counter()
+
+    def record(
+        self,
+        event: str,
+        table: str,
+        seconds: float = 0.0,
+        bytes_read: int = 0,
+        bytes_written: int = 0,
+        records: int = 0,
+        astype: Optional[str] = None,
+    ) -> None:
+        """Count an event, and notify the hooks."""
+        with self._lock:
+            self.seconds[event] += seconds
+            self.events[event] += 1
+            self.bytes_read += bytes_read
+            self.bytes_written += bytes_written
+            if astype is not None:
+                self.records_decoded[astype] += records
+            elif event == "append":
+                self.records_written += records
+        info = dict(
+            seconds=seconds,
+            bytes_read=bytes_read,
+            bytes_written=bytes_written,
+            records=records,
+            astype=astype,
+        )
+        for hook in self.hooks:
+            hook(event, table, info)
+        if self.parent is not None:
+            self.parent.record(event, table, **info)
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Snapshot of the counters."""
+        with self._lock:
+            return {
+                "bytes_read": self.bytes_read,
+                "bytes_written": self.bytes_written,
+                "records_decoded": dict(self.records_decoded),
+                "records_written": self.records_written,
+                "seconds": dict(self.seconds),
+                "events": dict(self.events),
+            }
+
+    def __repr__(self) -> str:
+        return f"Stats({self.as_dict()})"
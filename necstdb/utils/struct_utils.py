@@ -1,28 +1,51 @@
-from typing import List
+from typing import List, Tuple
+import functools
+import re
 import struct
 
-import numpy
+_TOKEN = re.compile(r"(\d*)([^\d\s])")
+
+
+@functools.lru_cache(maxsize=None)
+def _item_layout(char: str, endian: str) -> Tuple[int, int]:
+    """Size and alignment of single item of a format character."""
+    size = struct.calcsize(endian + char)
+    if endian not in ["", "@"]:
+        return size, 1  # Standard sizes are never aligned.
+    # Native alignment is the padding inserted after a preceding char.
+    return size, struct.calcsize("@c" + char) - size
 
 
 def get_struct_indices(fmt: List[str], endian: str = "") -> List[int]:
     """Calculate first indices of fields in byte string.
 
+    The offsets are computed in a single pass over the format characters, following
+    the rules of ``struct`` module; native alignment applies when ``endian`` is ""
+    or "@", repeat count of "s" and "p" is the length of single item, and zero repeat
+    count (e.g. "0l") only aligns the offset.
+
     Notes
     -----
-    Padding at the end is not supported.
+    The last element is the size of whole record, which equals to
+    ``struct.calcsize(endian + "".join(fmt))``. Each field starts where its first
+    item is placed, i.e. after the alignment padding which precedes it.
+
     """
-    format_str = endian + "".join(fmt)
-    indices = [struct.calcsize(format_str)]
-    for i in range(len(fmt)):
-        if i == 0:
-            tmp_fmt = fmt
-        else:
-            tmp_fmt = fmt[:-i]
-        idx = struct.calcsize(endian + "".join(tmp_fmt)) - struct.calcsize(tmp_fmt[-1])
-        indices.insert(0, idx)
+    offset = 0
+    indices = []
+    for field in fmt:
+        start = None
+        for count, char in _TOKEN.findall(field):
+            count = int(count) if count else 1
+            size, alignment = _item_layout(char, endian)
+            offset = -(-offset // alignment) * alignment
+            start = offset if start is None else start
+            offset += count if char in "sp" else count * size
+        indices.append(offset if start is None else start)
+    indices.append(offset)
     return indices
 
 
 def get_struct_sizes(fmt: List[str], endian: str = "") -> List[int]:
-    indices = numpy.array(get_struct_indices(fmt, endian))
-    return (indices[1:] - indices[:-1]).tolist()
+    indices = get_struct_indices(fmt, endian)
+    return [stop - start for start, stop in zip(indices[:-1], indices[1:])]
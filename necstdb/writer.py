@@ -0,0 +1,175 @@
+"""Asyncio front-end which writes appended records in the background."""
+
+import asyncio
+import concurrent.futures
+from typing import TYPE_CHECKING, Any, Dict, Tuple
+
+if TYPE_CHECKING:
+    from .necstdb import necstdb, table
+
+OVERFLOW_POLICIES = ["block", "drop"]
+
+
+class AsyncWriter:
+    """Background writer shared by the asynchronous tables of a database.
+
+    Records appended to ``AsyncTable`` are encoded in the event loop and put into
+    bounded per-table queues. A single writer task drains all the queues at a time,
+    and writes the records of each table at once in a worker thread, so that disk
+    I/O never blocks the event loop. Records appended while the previous batch is
+    being written are coalesced into the next one.
+
+    Parameters
+    ----------
+    db
+        Database the tables belong to.
+
+    """
+
+    def __init__(self, db: "necstdb") -> None:
+        self.db = db
+        self.tables: Dict[str, "table"] = {}
+        self._queues: Dict[str, asyncio.Queue] = {}
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self._task = None
+        self._error = None
+
+    def open(self, name: str, maxsize: int, overflow: str) -> "AsyncTable":
+        """Asynchronous appender of a table, opening the table if not yet."""
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(
+                f"Unknown overflow policy {overflow!r}, "
+                f"should be one of {OVERFLOW_POLICIES}."
+            )
+        if name not in self.tables:
+            self.tables[name] = self.db.open_table(name, mode="ab")
+        return AsyncTable(self, name, maxsize, overflow)
+
+    def _start(self) -> None:
+        """Create the loop-bound objects, which should be done in the running loop."""
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._lock = asyncio.Lock()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def put(self, t: "AsyncTable", item: Tuple[bytes, int]) -> bool:
+        """Queue encoded records, return False if they are dropped."""
+        if self._error is not None:
+            raise self._error
+        self._start()
+        if t.name not in self._queues:
+            self._queues[t.name] = asyncio.Queue(t.maxsize)
+        queue = self._queues[t.name]
+        if t.overflow == "drop":
+            try:
+                queue.put_nowait(item)
+            except asyncio.QueueFull:
+                return False
+        else:
+            await queue.put(item)
+        self._wakeup.set()
+        return True
+
+    async def flush(self) -> None:
+        """Write all the queued records, and wait for them to be written."""
+        if self._task is None:
+            return
+        async with self._lock:
+            await self._write_queued()
+        if self._error is not None:
+            raise self._error
+
+    async def close(self) -> None:
+        """Write all the queued records, then close the tables."""
+        try:
+            await self.flush()
+        finally:
+            if self._task is not None:
+                self._task.cancel()
+                self._task = None
+            loop = asyncio.get_running_loop()
+            tables, self.tables, self._queues = list(self.tables.values()), {}, {}
+            for t in tables:
+                await loop.run_in_executor(self._executor, t.close)
+            self._executor.shutdown()
+
+    async def _run(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            await asyncio.sleep(0)  # Let ready producers add to this batch.
+            async with self._lock:
+                await self._write_queued()
+
+    async def _write_queued(self) -> None:
+        batches = {}
+        for name, queue in self._queues.items():
+            items = [queue.get_nowait() for _ in range(queue.qsize())]
+            if items:
+                data, nrecords = zip(*items)
+                batches[name] = (b"".join(data), sum(nrecords))
+        if not batches:
+            return
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(self._executor, self._write, batches)
+        except Exception as e:
+            self._error = e
+
+    def _write(self, batches: Dict[str, Tuple[bytes, int]]) -> None:
+        """Write the batches, run in the worker thread."""
+        for name, (data, nrecords) in batches.items():
+            self.tables[name]._write(data, nrecords)
+            self.tables[name].flush()
+        self.db.sync()
+
+
+class AsyncTable:
+    """Asynchronous appender of a table, created by ``necstdb.async_table``.
+
+    Parameters
+    ----------
+    writer
+        Background writer of the database.
+    name
+        Name of the table.
+    maxsize
+        Maximum number of appends queued but not written yet.
+    overflow
+        What to do when the queue is full; "block" waits until the queued records
+        are written, "drop" discards the appended records.
+
+    Attributes
+    ----------
+    dropped: int
+        Number of records discarded by "drop" overflow policy.
+
+    """
+
+    def __init__(
+        self, writer: AsyncWriter, name: str, maxsize: int, overflow: str
+    ) -> None:
+        self.writer = writer
+        self.name = name
+        self.maxsize = maxsize
+        self.overflow = overflow
+        self.dropped = 0
+
+    async def append(self, *data: Any) -> None:
+        """Append data to the table."""
+        t = self.writer.tables[self.name]
+        await self._put(t._struct.pack(*data), 1)
+
+    async def append_many(self, data: Any) -> None:
+        """Append multiple records to the table at once, see ``table.append_many``."""
+        t = self.writer.tables[self.name]
+        encoded = t._encode_many(data)
+        await self._put(encoded, len(encoded) // t.record_size)
+
+    async def flush(self) -> None:
+        """Wait until the records appended so far are written."""
+        await self.writer.flush()
+
+    async def _put(self, data: bytes, nrecords: int) -> None:
+        if not await self.writer.put(self, (data, nrecords)):
+            self.dropped += nrecords
@@ -0,0 +1,48 @@
+import struct
+
+import numpy as np
+
+from necstdb.layout import RecordLayout
+
+TEST_COLS = [
+    {"key": "time", "format": "d"},
+    {"key": "flag", "format": "?"},
+    {"key": "array", "format": "3f"},
+    {"key": "_pad", "format": "2x"},
+    {"key": "name", "format": "3s"},
+]
+
+
+def test_record_layout():
+    layout = RecordLayout.of(TEST_COLS, "<")
+    assert layout.format == "<d?3f2x3s"
+    assert layout.size == struct.calcsize("<d?3f2x3s")
+    assert layout.offsets == [0, 8, 9, 21, 23]
+    assert layout.data_keys == ["time", "flag", "array", "name"]
+    assert layout.dtype.itemsize == layout.size
+    assert layout.dtype["array"].shape == (3,)
+
+
+def test_record_layout_memoized():
+    layout = RecordLayout.of(TEST_COLS, "<")
+    assert RecordLayout.of([dict(col) for col in TEST_COLS], "<") is layout
+    assert RecordLayout.of(TEST_COLS, ">") is not layout
+    assert layout.raw_dtype(["array"]) is layout.raw_dtype(["array"])
+
+
+def test_dtypes():
+    layout = RecordLayout.of(TEST_COLS, "<")
+    data = layout.struct.pack(1.5, True, 1, 2, 3, b"abc") * 2
+    records = np.frombuffer(data, dtype=layout.dtype)
+    assert records["time"].tolist() == [1.5, 1.5]
+    assert np.array_equal(records["array"][1], [1, 2, 3])
+    raw = np.frombuffer(data, dtype=layout.raw_dtype(["name"]))
+    assert raw["name"][0].tobytes() == b"abc"
+
+
+def test_standard_size():
+    for endian in ["<", ">", "="]:
+        layout = RecordLayout.of(
+            [{"key": "long", "format": "l"}, {"key": "ulong", "format": "3L"}], endian
+        )
+        assert layout.dtype.itemsize == layout.size == 16
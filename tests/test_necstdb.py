@@ -1,4 +1,10 @@
+import asyncio
+import json
+import os
+import shutil
 import struct
+import tarfile
+import warnings
 from pathlib import Path
 
 import numpy as np
@@ -373,6 +379,201 @@ class TestPartialRead:
         # Order insensitive match
         assert all(EXPECTED_DATA4_BYTE[idx] in actual for idx in slices)
 
+    def test_partial_read_aligned(self, tmp_path):
+        db = necstdb.opendb(tmp_path, mode="w")
+        header = {
+            "data": [
+                {"key": "bool", "format": "?"},
+                {"key": "float64", "format": "d"},
+                {"key": "string", "format": "3s"},
+                {"key": "int32", "format": "i"},
+            ]
+        }
+        db.create_table("aligned", header, endian="")
+        table = db.open_table("aligned", mode="ab")
+        for i in range(10):
+            table.append(True, i / 2, b"abc", -i)
+        table.close()
+
+        table = db.open_table("aligned")
+        cols = ["string", "int32"]
+        assert table.read(astype="tuple", start=3, num=2, cols=cols) == (
+            (b"abc", -3),
+            (b"abc", -4),
+        )
+        assert table.read(astype="dict", cols=cols)[5] == {
+            "string": b"abc",
+            "int32": -5,
+        }
+        actual = table.read(astype="sa", cols=["float64", "int32"])
+        assert (actual["float64"] == np.arange(10) / 2).all()
+        assert (actual["int32"] == -np.arange(10)).all()
+
+    def test_read_format_sequence(self, tmp_path):
+        db = necstdb.opendb(tmp_path, mode="w")
+        header = {
+            "data": [
+                {"key": "array", "format": "ddd"},
+                {"key": "mixed", "format": "dI"},
+                {"key": "string", "format": "5s"},
+            ]
+        }
+        db.create_table("sequence", header)
+        table = db.open_table("sequence", mode="ab")
+        for i in range(5):
+            table.append(i, TIME, TIME, 0.5, i, b"ab")
+        table.close()
+
+        table = db.open_table("sequence")
+        expected = {"array": (3, TIME, TIME), "mixed": (0.5, 3), "string": b"ab\0\0\0"}
+        assert table.read(astype="dict")[3] == expected
+        actual = table.read(astype="df")
+        assert actual.loc[3].to_dict() == expected
+        actual = table.read(astype="sa")
+        assert actual["array"].shape == (5, 3)
+        assert actual["mixed"]["f1"].tolist() == list(range(5))
+
+    @pytest.mark.parametrize("endian", ["<", ">", ""])
+    def test_read_long(self, tmp_path, endian):
+        db = necstdb.opendb(tmp_path, mode="w")
+        header = {
+            "data": [
+                {"key": "flag", "format": "?"},
+                {"key": "long", "format": "l"},
+                {"key": "ulong", "format": "2L"},
+            ]
+        }
+        db.create_table("long", header, endian=endian)
+        table = db.open_table("long", mode="ab")
+        for i in range(5):
+            table.append(True, -i, i, 2**31 + i)
+        table.close()
+
+        table = db.open_table("long")
+        expected = tuple((True, -i, i, 2**31 + i) for i in range(5))
+        assert table.read() == expected
+        actual = table.read(astype="sa")
+        assert actual["long"].tolist() == [-i for i in range(5)]
+        assert actual["ulong"][:, 1].tolist() == [2**31 + i for i in range(5)]
+        assert table.read(astype="df")["long"].tolist() == [-i for i in range(5)]
+
+    @pytest.mark.parametrize("endian", ["<", ">"])
+    def test_read_df_dtypes(self, tmp_path, endian):
+        db = necstdb.opendb(tmp_path, mode="w")
+        db.create_table("data", TIMED_HEADER.copy(), endian=endian)
+        table = db.open_table("data", mode="ab")
+        for i in range(5):
+            table.append(TIME + i, 4 - i, i, -i)
+        table.close()
+
+        table = db.open_table("data")
+        actual = table.read(astype="df")
+        expected = pd.DataFrame.from_dict(table.read(astype="dict"))
+        assert actual["time"].dtype == np.float64
+        assert actual["value"].dtype == np.int64
+        pd.testing.assert_frame_equal(actual, expected)
+        assert actual.sort_values("value")["value"].tolist() == list(range(5))
+        assert actual.groupby("value")["time"].sum().index.tolist() == list(range(5))
+
+        actual = table.read(astype="df", expand_arrays=True)
+        assert actual.columns.tolist() == ["time", "value", "array_0", "array_1"]
+        assert actual["array_0"].dtype == np.float64
+        assert actual["array_1"].tolist() == [0, -1, -2, -3, -4]
+        with pytest.raises(ValueError):
+            _ = table.read(astype="sa", expand_arrays=True)
+
+    @pytest.mark.parametrize(
+        "options", [{}, {"layout": "column"}, {"compression": "zlib"}]
+    )
+    def test_read_df_expand_arrays_empty(self, tmp_path, options):
+        db = necstdb.opendb(tmp_path, mode="w")
+        db.create_table("empty", TIMED_HEADER.copy(), **options)
+        actual = db.open_table("empty").read(astype="df", expand_arrays=True)
+        assert actual.columns.tolist() == ["time", "value", "array_0", "array_1"]
+        assert len(actual) == 0
+
+
+TIMED_HEADER = {
+    "data": [
+        {"key": "time", "format": "d"},
+        {"key": "value", "format": "i"},
+        {"key": "array", "format": "2f"},
+    ]
+}
+
+
+@pytest.fixture
+def timed_db(tmp_path) -> necstdb.necstdb.necstdb:
+    """Database with monotonic and non-monotonic timestamped tables."""
+    db = necstdb.opendb(tmp_path, mode="w")
+    db.create_table("sorted", TIMED_HEADER)
+    db.create_table("unsorted", TIMED_HEADER)
+    tables = {name: db.open_table(name, mode="ab") for name in ["sorted", "unsorted"]}
+    for i in range(100):
+        tables["sorted"].append(TIME + i, i, 0.5, 1.5)
+        tables["unsorted"].append(TIME + (i * 37) % 100, i, 0.5, 1.5)
+    _ = [tab.close() for tab in tables.values()]
+    return db
+
+
+class TestTimeRangeRead:
+    def test_time_range(self, timed_db):
+        table = timed_db.open_table("sorted")
+        assert table.time_range(TIME + 10, TIME + 19.5) == (10, 20)
+        assert table.time_range(TIME - 10, TIME - 1) == (0, 0)
+        assert table.time_range(TIME + 99, TIME + 200) == (99, 100)
+
+    def test_read_time_range(self, timed_db):
+        table = timed_db.open_table("sorted")
+        actual, (start, stop) = table.read_time_range(TIME + 10, TIME + 19, astype="sa")
+        assert (start, stop) == (10, 20)
+        assert actual["value"].tolist() == list(range(10, 20))
+
+        actual, _ = table.read_time_range(
+            TIME + 10, TIME + 19, cols=["value"], astype="tuple"
+        )
+        assert actual == tuple((i,) for i in range(10, 20))
+
+    def test_read_time_range_not_monotonic(self, timed_db):
+        table = timed_db.open_table("unsorted")
+        actual, (start, stop) = table.read_time_range(TIME + 10, TIME + 19, astype="df")
+        expected = [i for i in range(100) if 10 <= (i * 37) % 100 <= 19]
+        assert (start, stop) == (expected[0], expected[-1] + 1)
+        assert actual["value"].tolist() == expected
+
+        actual, _ = table.read_time_range(TIME + 10, TIME + 19, astype="raw")
+        assert len(actual) == len(expected) * table.record_size
+
+    def test_read_time_range_unknown_key(self, timed_db):
+        table = timed_db.open_table("sorted")
+        with pytest.raises(ValueError):
+            _ = table.read_time_range(TIME, TIME + 1, key="timestamp")
+        with pytest.raises(ValueError):
+            _ = table.read_time_range(TIME, TIME + 1, key="array")
+
+
+class TestRelog:
+    def test_relog(self, timed_db, tmp_path):
+        timed_db.create_table("zlib", TIMED_HEADER.copy(), compression="zlib")
+        timed_db.create_table("config", {"data": [{"key": "value", "format": "i"}]})
+        for name, cols in [("zlib", []), ("config", ["value"])]:
+            table = timed_db.open_table(name, mode="ab")
+            table.append_many(timed_db.open_table("sorted").read(cols=cols))
+            table.close()
+        newdb = necstdb.relog(
+            timed_db, TIME + 10, TIME + 19, saveto=tmp_path / "extracted"
+        )
+        assert newdb.list_tables() == ["config", "sorted", "unsorted", "zlib"]
+
+        sorted_table = newdb.open_table("sorted")
+        assert sorted_table.read() == timed_db.open_table("sorted").read(10, 10)
+        assert newdb.open_table("zlib").compression["codec"] == "zlib"
+        actual = newdb.open_table("unsorted").read(cols=["value"])
+        assert actual == tuple((i,) for i in range(100) if 10 <= (i * 37) % 100 <= 19)
+        assert len(newdb.open_table("config").read()) == 100
+        data, info = newdb.read_file("relog.txt")
+        assert str(timed_db.path.resolve()) in info
+
 
 @pytest.fixture(scope="module")
 def archive_dir_path(tmp_path_factory) -> Path:
@@ -393,6 +594,132 @@ class TestMethods:
 
         assert save_path.exists()
 
+    @pytest.mark.parametrize("compression", [None, "gz", "bz2", "xz"])
+    def test_checkout_incremental(self, timed_db, archive_dir_path, compression):
+        calls = []
+        full = archive_dir_path / f"full-{compression}.tar"
+        summary = timed_db.checkout(
+            full,
+            compression=compression,
+            block_size=1000,
+            progress=lambda *args: calls.append(args),
+        )
+        assert summary["bytes"] == calls[-1][0] == calls[-1][1]
+        with tarfile.open(full) as tar:
+            assert any(name.endswith("sorted.data") for name in tar.getnames())
+
+        table = timed_db.open_table("sorted", mode="ab")
+        table.append(TIME + 100, 100, 0.5, 1.5)
+        table.close()
+        incremental = archive_dir_path / f"incremental-{compression}.tar"
+        summary = timed_db.checkout(
+            incremental, compression=compression, incremental=True
+        )
+        assert (summary["files"], summary["bytes"]) == (1, 20)
+
+        restored_path = archive_dir_path / f"restored-{compression}"
+        necstdb.restore([full, incremental], restored_path)
+        (restored,) = restored_path.glob("**/sorted.data")
+        expected = (timed_db.path / "sorted.data").read_bytes()
+        assert restored.read_bytes() == expected
+
+        # Torn tail, then truncated on repair and regrown past the previous size.
+        with (timed_db.path / "sorted.data").open("ab") as f:
+            f.write(b"\x01" * 3)
+        torn = archive_dir_path / f"torn-{compression}.tar"
+        summary = timed_db.checkout(torn, compression=compression, incremental=True)
+        assert summary["bytes"] == 3
+        with pytest.warns(UserWarning, match="repaired"):
+            table = timed_db.open_table("sorted", mode="ab", repair="truncate")
+        table.append_many([(TIME + i, i, 0.5, 1.5) for i in range(101, 103)])
+        table.close()
+        repaired = archive_dir_path / f"repaired-{compression}.tar"
+        summary = timed_db.checkout(repaired, compression=compression, incremental=True)
+        assert summary["bytes"] == 103 * 20  # Archived as a whole
+
+        restored_path = archive_dir_path / f"restored-repaired-{compression}"
+        necstdb.restore([full, incremental, torn, repaired], restored_path)
+        (restored,) = restored_path.glob("**/sorted.data")
+        expected = (timed_db.path / "sorted.data").read_bytes()
+        assert restored.read_bytes() == expected
+
+    @pytest.mark.parametrize("compression", [None, "gz", "xz"])
+    @pytest.mark.parametrize("seek_index", [True, False])
+    def test_open_archive(self, timed_db, archive_dir_path, compression, seek_index):
+        timed_db.create_table("column", TIMED_HEADER.copy(), layout="column")
+        timed_db.create_table("zlib", TIMED_HEADER.copy(), compression="zlib")
+        for name in ["column", "zlib"]:
+            table = timed_db.open_table(name, mode="ab")
+            table.append_many(timed_db.open_table("sorted").read())
+            table.close()
+        path = archive_dir_path / f"opened-{compression}-{seek_index}.tar"
+        timed_db.checkout(path, compression=compression, block_size=512)
+        if (not seek_index) and (compression is not None):
+            path.with_name(path.name + ".index").unlink()
+
+        db = necstdb.opendb(path)
+        assert db.list_tables() == timed_db.list_tables()
+        for name in db.list_tables():
+            expected = timed_db.open_table(name).read(astype="sa")
+            table = db.open_table(name)
+            assert np.array_equal(table.read(astype="sa"), expected)
+            assert table.read(start=50, num=2) == timed_db.open_table(name).read(
+                start=50, num=2
+            )
+        assert db.open_table("sorted").time_range(TIME + 10, TIME + 19.5) == (10, 20)
+        assert db.get_info()["#records"].tolist() == [100] * 4
+        assert db.read_tables(["sorted"], processes=True)["sorted"] == (
+            timed_db.open_table("sorted").read()
+        )
+        if compression is None:
+            assert isinstance(db.open_table("sorted").view(), np.memmap)
+        elif seek_index:
+            archive = db.path.archive
+            archive._cache.clear()
+            _ = db.open_table("sorted").read(start=10, num=1)
+            assert 0 < len(archive._cache) < len(archive.blocks)
+        with pytest.raises(Exception):
+            _ = necstdb.opendb(path, mode="w")
+
+    def test_open_archive_stale_index(self, timed_db, archive_dir_path):
+        path = archive_dir_path / "stale.tar.gz"
+        timed_db.checkout(path, compression="gz", block_size=512)
+        assert necstdb.opendb(path).path.archive.blocks is not None
+
+        other = archive_dir_path / "other.tar.gz"
+        timed_db.open_table("unsorted", mode="wb").close()
+        timed_db.checkout(other, compression="gz")
+        os.replace(other, path)  # Replaced without the seek index.
+        db = necstdb.opendb(path)
+        assert db.path.archive.blocks is None
+        assert db.open_table("unsorted").read() == ()
+
+    @pytest.mark.parametrize("compression", [None, "gz"])
+    def test_open_incremental_archive(self, timed_db, archive_dir_path, compression):
+        timed_db.checkout(archive_dir_path / "full.tar", compression=compression)
+        table = timed_db.open_table("sorted", mode="ab")
+        table.append(TIME + 100, 100, 0.5, 1.5)
+        table.close()
+        path = archive_dir_path / "incremental.tar"
+        timed_db.checkout(path, compression=compression, incremental=True)
+        with pytest.raises(Exception, match="incremental"):
+            _ = necstdb.opendb(path)
+
+    def test_read_tables(self, db_path):
+        db = necstdb.opendb(db_path)
+        expected = {name: db.open_table(name).read() for name in table_name}
+        assert db.read_tables() == expected
+        assert db.read_tables(max_workers=2, max_bytes=1000) == expected
+        assert db.read_tables(processes=True) == expected
+
+        actual = db.read_tables(
+            ["data1", "data4"], cols={"data4": ["bool"]}, astype="sa"
+        )
+        assert list(actual) == ["data1", "data4"]
+        assert actual["data4"].dtype.names == ("bool",)
+        with pytest.raises(Exception):
+            _ = db.read_tables(["data1", "nonexistent"])
+
     def test_get_info(self, db_path):
         db = necstdb.opendb(db_path)
         actual = db.get_info()
@@ -417,3 +744,733 @@ class TestMethods:
         assert all(actual["#records"] == expected["#records"])
         assert all(actual["record size [byte]"] == expected["record size [byte]"])
         assert all(actual["format"] == expected["format"])
+
+    def test_get_info_catalog(self, timed_db):
+        timed_db.create_table("column", TIMED_HEADER.copy(), layout="column")
+        timed_db.create_table("zlib", TIMED_HEADER.copy(), compression="zlib")
+        for name in ["column", "zlib"]:
+            table = timed_db.open_table(name, mode="ab")
+            table.append_many(timed_db.open_table("sorted").read())
+            table.close()
+        assert (timed_db.path / necstdb.necstdb.CATALOG_NAME).exists()
+
+        actual = timed_db.get_info()
+        assert actual.index.tolist() == ["column", "sorted", "unsorted", "zlib"]
+        assert actual["#records"].tolist() == [100] * 4
+        assert actual.loc["column", "file size [byte]"] == 100 * 20
+        assert actual.loc["sorted", "format"] == "<di2f"
+
+        table = timed_db.open_table("zlib", mode="ab")  # Counts follow the files
+        table.append(TIME + 100, 100, 0.5, 1.5)
+        table.close()
+        assert timed_db.get_info().loc["zlib", "#records"] == 101
+        (timed_db.path / "unsorted.data").unlink()
+        assert timed_db.get_info().index.tolist() == ["column", "sorted", "zlib"]
+
+
+class TestView:
+    def test_view(self, timed_db):
+        table = timed_db.open_table("sorted")
+        view = table.view()
+        assert isinstance(view, np.memmap)
+        assert view.dtype.names == ("time", "value", "array")
+        assert view["value"][10:20].tolist() == list(range(10, 20))
+        assert view[-1]["time"] == TIME + 99
+        assert table.view() is view
+
+    def test_view_grows(self, timed_db):
+        table = timed_db.open_table("sorted")
+        assert len(table.view()) == 100
+
+        writer = timed_db.open_table("sorted", mode="ab")
+        writer.append(TIME + 100, 100, 0.5, 1.5)
+        writer.close()
+
+        view = table.view()
+        assert len(view) == table.nrecords == 101
+        assert view["value"][-1] == 100
+
+
+class TestAppendMany:
+    def test_append_many(self, tmp_path):
+        db = necstdb.opendb(tmp_path, mode="w")
+        db.create_table("many", TIMED_HEADER)
+        table = db.open_table("many", mode="ab")
+        for i in range(3):
+            table.append(TIME + i, i, 0.5, 1.5)
+        table.append_many([(TIME + i, i, [0.5, 1.5]) for i in range(3, 6)])
+        table.append_many(pd.DataFrame({"time": [], "value": [], "array": []}))
+        table.append_many(
+            {
+                "time": TIME + np.arange(6, 9),
+                "value": np.arange(6, 9),
+                "array": [(0.5, 1.5)] * 3,
+            }
+        )
+        table.append_many(
+            pd.DataFrame(
+                {
+                    "time": TIME + np.arange(9, 12),
+                    "value": np.arange(9, 12),
+                    "array": [(0.5, 1.5)] * 3,
+                }
+            )
+        )
+        table.flush()
+        array = db.open_table("many").read(astype="sa", num=3)
+        table.append_many(array)
+        table.close()
+
+        actual = db.open_table("many").read(astype="tuple")
+        expected = [(TIME + i, i, 0.5, 1.5) for i in range(12)]
+        expected += expected[:3]
+        assert actual == tuple(expected)
+
+    def test_append_many_missing_column(self, tmp_path):
+        db = necstdb.opendb(tmp_path, mode="w")
+        db.create_table("many", TIMED_HEADER)
+        table = db.open_table("many", mode="ab")
+        with pytest.raises(ValueError):
+            table.append_many({"time": [TIME], "value": [1]})
+
+    def test_flush_policy(self, tmp_path):
+        db = necstdb.opendb(tmp_path, mode="w")
+        db.create_table("buffered", TIMED_HEADER)
+        table = db.open_table("buffered", mode="ab", flush_records=10)
+        data_path = tmp_path / "buffered.data"
+
+        table.append_many([(TIME + i, i, 0.5, 1.5) for i in range(9)])
+        assert data_path.stat().st_size == 0
+        table.append(TIME + 9, 9, 0.5, 1.5)
+        assert data_path.stat().st_size == 10 * table.record_size
+
+        table.append(TIME + 10, 10, 0.5, 1.5)
+        assert data_path.stat().st_size == 10 * table.record_size
+        table.flush()
+        assert data_path.stat().st_size == 11 * table.record_size
+
+        table.append(TIME + 11, 11, 0.5, 1.5)
+        table.close()
+        assert data_path.stat().st_size == 12 * table.record_size
+
+        table = db.open_table("buffered", mode="ab", flush_bytes=1)
+        table.append(TIME + 12, 12, 0.5, 1.5)
+        assert data_path.stat().st_size == 13 * table.record_size
+
+
+class TestIterChunks:
+    def test_iter_chunks(self, timed_db):
+        table = timed_db.open_table("sorted")
+        chunks = list(table.iter_chunks(30, astype="sa"))
+        assert [len(chunk) for chunk in chunks] == [30, 30, 30, 10]
+        assert np.concatenate(chunks)["value"].tolist() == list(range(100))
+
+        chunks = list(table.iter_chunks(30, cols=["value"], start=5, num=40))
+        assert sum(chunks, ()) == tuple((i,) for i in range(5, 45))
+
+        chunks = list(table.iter_chunks(30, astype="raw"))
+        assert b"".join(chunks) == table.read(astype="raw")
+
+    def test_iter_chunks_time_range(self, timed_db):
+        table = timed_db.open_table("sorted")
+        chunks = table.iter_chunks(4, astype="df", t0=TIME + 10, t1=TIME + 19)
+        actual = pd.concat(list(chunks), ignore_index=True)
+        assert actual["value"].tolist() == list(range(10, 20))
+
+        table = timed_db.open_table("unsorted")
+        chunks = table.iter_chunks(4, astype="df", t0=TIME + 10, t1=TIME + 19)
+        actual = pd.concat(list(chunks), ignore_index=True)
+        expected, _ = table.read_time_range(TIME + 10, TIME + 19, astype="df")
+        assert actual["value"].tolist() == expected["value"].tolist()
+
+
+class TestColumnLayout:
+    @pytest.fixture
+    def column_db(self, tmp_path) -> necstdb.necstdb.necstdb:
+        db = necstdb.opendb(tmp_path, mode="w")
+        for name, layout in [("row", "row"), ("column", "column")]:
+            db.create_table(name, DATA4_HEADER.copy(), layout=layout)
+            table = db.open_table(name, mode="ab")
+            for i in range(44):
+                table.append(True, b"str", i, TIME, TIME)
+            table.append_many([(False, b"abc", i, TIME, TIME) for i in range(44, 50)])
+            table.close()
+        return db
+
+    def test_column_files(self, column_db):
+        column_dir = column_db.path / "column.columns"
+        assert sorted(p.name for p in column_dir.iterdir()) == [
+            "array.data",
+            "bool.data",
+            "string.data",
+        ]
+        assert (column_dir / "array.data").stat().st_size == 50 * 24
+        assert column_db.list_tables() == ["column", "row"]
+        assert column_db.open_table("column").nrecords == 50
+
+    def test_read_column_layout(self, column_db):
+        row = column_db.open_table("row")
+        column = column_db.open_table("column")
+        for astype in ["tuple", "dict", "raw"]:
+            assert column.read(astype=astype) == row.read(astype=astype)
+            kwargs = dict(astype=astype, start=3, num=5, cols=["array", "bool"])
+            assert column.read(**kwargs) == row.read(**kwargs)
+        assert (column.read(astype="sa") == row.read(astype="sa")).all()
+        actual = column.read(astype="df", cols=["string"])
+        assert actual["string"].tolist() == [b"str"] * 44 + [b"abc"] * 6
+
+        assert column.time_range(2, 5, key="bool") == (0, 0)
+        chunks = list(column.iter_chunks(20, cols=["bool"], astype="sa"))
+        assert [len(chunk) for chunk in chunks] == [20, 20, 10]
+        with pytest.raises(ValueError):
+            _ = column.view()
+
+
+class TestCompression:
+    @pytest.fixture
+    def compressed_db(self, tmp_path) -> necstdb.necstdb.necstdb:
+        db = necstdb.opendb(tmp_path, mode="w")
+        db.create_table("row", TIMED_HEADER.copy())
+        db.create_table(
+            "zlib", TIMED_HEADER.copy(), compression="zlib", block_records=7
+        )
+        for name in ["row", "zlib"]:
+            table = db.open_table(name, mode="ab")
+            for i in range(30):
+                table.append(TIME + i, i, 0.5, 1.5)
+            table.flush()  # Write partial block, which will be rewritten.
+            table.append_many([(TIME + i, i, 0.5, 1.5) for i in range(30, 40)])
+            table.close()
+            table = db.open_table(name, mode="ab")  # Continue filling the last block
+            table.append_many([(TIME + i, i, 0.5, 1.5) for i in range(40, 50)])
+            table.close()
+        return db
+
+    def test_block_index(self, compressed_db):
+        table = compressed_db.open_table("zlib")
+        index = table._read_block_index()
+        assert index["nrecords"].tolist() == [7] * 7 + [1]
+        assert table.nrecords == 50
+        assert (compressed_db.path / "zlib.data").stat().st_size < 50 * 20
+
+    def test_read_compressed(self, compressed_db):
+        row = compressed_db.open_table("row")
+        compressed = compressed_db.open_table("zlib")
+        for astype in ["tuple", "dict", "raw"]:
+            assert compressed.read(astype=astype) == row.read(astype=astype)
+            kwargs = dict(astype=astype, start=5, num=20, cols=["value", "array"])
+            assert compressed.read(**kwargs) == row.read(**kwargs)
+        assert compressed.read(start=45, num=10) == row.read(start=45, num=10)
+
+        assert compressed.time_range(TIME + 10, TIME + 19.5) == (10, 20)
+        actual, _ = compressed.read_time_range(TIME + 10, TIME + 19, astype="sa")
+        assert actual["value"].tolist() == list(range(10, 20))
+        chunks = list(compressed.iter_chunks(6, cols=["value"], t0=TIME + 3))
+        assert sum(chunks, ()) == tuple((i,) for i in range(3, 50))
+
+    def test_block_cache(self, compressed_db):
+        table = compressed_db.open_table("zlib")
+        table.block_cache_size = 2
+        _ = table.read()
+        assert len(table._block_cache) == 2
+        _ = table.read(num=1)
+        assert len(table._block_cache) == 2
+
+    def test_rewrite_table(self, compressed_db):
+        table = compressed_db.open_table("zlib", mode="wb")
+        table.append(TIME, 0, 0.5, 1.5)
+        table.close()
+        assert compressed_db.open_table("zlib").read() == ((TIME, 0, 0.5, 1.5),)
+
+    def test_block_rewrite(self, compressed_db, tmp_path, monkeypatch):
+        path = compressed_db.path
+        snapshots = []
+
+        def snapshot(func):
+            def wrapped(*args):
+                files = {ext: path / f"zlib.{ext}" for ext in ["data", "index"]}
+                snapshots.append({k: v.read_bytes() for k, v in files.items()})
+                return func(*args)
+
+            return wrapped
+
+        for name in ["pwrite", "ftruncate"]:
+            monkeypatch.setattr(
+                necstdb.necstdb.os, name, snapshot(getattr(necstdb.necstdb.os, name))
+            )
+        table = compressed_db.open_table("zlib", mode="ab")
+        for i in range(50, 60):
+            table.append(TIME + i, i, 0.5, 1.5)
+            table.flush()
+        table.close()
+        monkeypatch.undo()
+        assert snapshots
+
+        # Interrupted at any point, the records flushed before are kept.
+        crashed = necstdb.opendb(tmp_path / "crashed", mode="w")
+        crashed.create_table("zlib", TIMED_HEADER.copy(), compression="zlib")
+        (crashed.path / "zlib.header").write_bytes((path / "zlib.header").read_bytes())
+        for snapshot in snapshots:
+            for ext, data in snapshot.items():
+                (crashed.path / f"zlib.{ext}").write_bytes(data)
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")
+                table = crashed.open_table("zlib", mode="ab", repair="truncate")
+            actual = table.read(cols=["value"])
+            table.close()
+            assert len(actual) >= 50
+            assert actual == tuple((i,) for i in range(len(actual)))
+
+        # The space of the replaced blocks is reused.
+        index = compressed_db.open_table("zlib")._read_block_index()
+        assert (path / "zlib.data").stat().st_size == index["size"].sum()
+        assert compressed_db.open_table("zlib").read(cols=["value"])[-1] == (59,)
+
+
+class TestZoneMap:
+    @pytest.fixture
+    def zonemap_db(self, tmp_path) -> necstdb.necstdb.necstdb:
+        db = necstdb.opendb(tmp_path, mode="w")
+        db.create_table("row", TIMED_HEADER.copy(), zonemap=["time"], block_records=8)
+        db.create_table(
+            "zlib",
+            TIMED_HEADER.copy(),
+            compression="zlib",
+            block_records=8,
+            zonemap=["time", "value"],
+        )
+        for name in ["row", "zlib"]:
+            table = db.open_table(name, mode="ab")
+            for i in range(50):
+                table.append(TIME + i, (i * 37) % 50, 0.5, 1.5)
+            table.close()
+        return db
+
+    def test_zonemap_maintained(self, zonemap_db):
+        with (zonemap_db.path / "row.zonemap").open() as f:
+            zonemap = json.load(f)
+        assert zonemap["nrecords"] == 50
+        assert zonemap["count"] == [8] * 6 + [2]
+        assert zonemap["columns"]["time"]["min"][1] == TIME + 8
+        assert zonemap["columns"]["time"]["max"][-1] == TIME + 49
+
+        table = zonemap_db.open_table("row", mode="ab")
+        table.append(TIME + 50, 0, 0.5, 1.5)
+        table.close()
+        with (zonemap_db.path / "row.zonemap").open() as f:
+            zonemap = json.load(f)
+        assert zonemap["count"] == [8] * 6 + [3]
+        assert zonemap["columns"]["time"]["max"][-1] == TIME + 50
+
+    def test_zonemap_updated_per_block(self, zonemap_db, monkeypatch):
+        updates = []
+        update = necstdb.necstdb.table._update_zonemap
+        monkeypatch.setattr(
+            necstdb.necstdb.table,
+            "_update_zonemap",
+            lambda self, *args: updates.append(1) or update(self, *args),
+        )
+        table = zonemap_db.open_table("row", mode="ab")
+        for i in range(10):
+            table.append(TIME + 50 + i, 0, 0.5, 1.5)
+            table.flush()
+        assert len(updates) == 1  # Only when a block worth of records is appended
+        table.close()
+        assert len(updates) == 2
+        with (zonemap_db.path / "row.zonemap").open() as f:
+            assert json.load(f)["nrecords"] == 60
+
+    @pytest.mark.parametrize("name", ["row", "zlib"])
+    def test_zonemap_rewritten(self, zonemap_db, name):
+        table = zonemap_db.open_table(name, mode="wb")
+        table.append_many([(TIME + 100 + i, 70, 0.5, 1.5) for i in range(50)])
+        table.close()
+        table = zonemap_db.open_table(name)
+        assert len(table.query({"time": (None, TIME + 99)})) == 0
+        assert len(table.query({"time": (TIME + 110, TIME + 119)})) == 10
+
+    def test_zonemap_rewritten_by_others(self, zonemap_db):
+        table = zonemap_db.open_table("row")
+        data = bytearray(table.read(astype="raw"))
+        data[-table.record_size :] = table._struct.pack(TIME + 100, 0, 0.5, 1.5)
+        (zonemap_db.path / "row.data").write_bytes(data)
+        assert len(table.query({"time": (TIME + 100, None)})) == 1
+
+    @pytest.mark.parametrize("name", ["row", "zlib"])
+    def test_query(self, zonemap_db, name):
+        table = zonemap_db.open_table(name)
+        actual = table.query({"time": (TIME + 10, TIME + 19)}, astype="sa")
+        assert actual["time"].tolist() == [TIME + i for i in range(10, 20)]
+
+        actual = table.query({"time": (None, TIME + 19), "value": (10, None)})
+        expected = [i for i in range(20) if (i * 37) % 50 >= 10]
+        assert [record[0] - TIME for record in actual] == expected
+
+        actual = table.query({"time": (TIME + 100, None)}, cols=["value"])
+        assert actual == ()
+
+    def test_build_zonemap(self, timed_db):
+        timed_db.build_zonemap("unsorted", ["time"], block_records=10)
+        with (timed_db.path / "unsorted.zonemap").open() as f:
+            zonemap = json.load(f)
+        assert zonemap["columns"]["time"]["min"][:2] == [TIME, TIME + 3]
+
+        table = timed_db.open_table("unsorted")
+        actual = table.query({"time": (TIME + 10, TIME + 19)}, cols=["value"])
+        assert actual == tuple((i,) for i in range(100) if 10 <= (i * 37) % 100 < 20)
+        with pytest.raises(ValueError):
+            timed_db.build_zonemap("unsorted", ["array"])
+
+
+class TestFollow:
+    def test_follow(self, timed_db):
+        table = timed_db.open_table("sorted")
+        follower = table.follow(
+            cols=["value"], start=90, interval=0.01, timeout=0.05, records_per_batch=8
+        )
+        assert next(follower) == tuple((i,) for i in range(90, 98))
+        assert next(follower) == ((98,), (99,))
+
+        writer = timed_db.open_table("sorted", mode="ab")
+        writer.append(TIME + 100, 100, 0.5, 1.5)
+        writer.flush()
+        with (timed_db.path / "sorted.data").open("ab") as f:
+            f.write(b"\x00" * 5)  # Torn record, being written
+        assert next(follower) == ((100,),)
+        with pytest.raises(StopIteration):
+            next(follower)
+        writer.close()
+
+    def test_afollow(self, timed_db):
+        table = timed_db.open_table("sorted")
+
+        async def collect():
+            batches = []
+            async for batch in table.afollow(
+                astype="sa", start=95, interval=0.01, timeout=0.05
+            ):
+                batches.append(batch)
+            return batches
+
+        batches = asyncio.run(collect())
+        assert len(batches) == 1
+        assert batches[0]["value"].tolist() == list(range(95, 100))
+
+    def test_follow_from_end(self, timed_db):
+        table = timed_db.open_table("sorted")
+        follower = table.follow(cols=["value"], interval=0.01, timeout=0.05)
+        afollower = table.afollow(cols=["value"], interval=0.01, timeout=0.05)
+        writer = timed_db.open_table("sorted", mode="ab")
+        writer.append(TIME + 100, 100, 0.5, 1.5)
+        writer.close()  # Appended before the first iteration, after the call
+
+        assert next(follower) == ((100,),)
+        assert asyncio.run(afollower.__anext__()) == ((100,),)
+
+
+class TestDecimation:
+    def test_read_every(self, timed_db):
+        table = timed_db.open_table("sorted")
+        actual = table.read(cols=["value"], every=10)
+        assert actual == tuple((i,) for i in range(0, 100, 10))
+        actual = table.read(start=5, num=20, every=7, astype="sa")
+        assert actual["value"].tolist() == [5, 12, 19]
+        with pytest.raises(ValueError):
+            _ = table.read(every=0)
+
+    def test_aggregate(self, timed_db):
+        for name in ["sorted", "unsorted"]:
+            table = timed_db.open_table(name)
+            actual = table.aggregate(
+                10, funcs=["count", "mean", "min", "max"], records_per_chunk=33
+            )
+            assert actual["time"].tolist() == [
+                np.floor(TIME / 10 + i) * 10 for i in range(11)
+            ]
+            assert actual["value_count"].sum() == 100
+            assert "array_mean" not in actual
+
+        table = timed_db.open_table("sorted")
+        actual = table.aggregate(
+            10, funcs=["sum", "std"], cols=["value"], astype="dict"
+        )
+        expected = table.read(astype="df")
+        expected = expected.groupby(np.floor(expected["time"] / 10))["value"]
+        assert np.allclose(actual["value_sum"], expected.sum())
+        assert np.allclose(actual["value_std"], expected.std(ddof=0))
+        actual = table.aggregate(10, funcs=["std"], cols=["value"], ddof=1)
+        assert np.allclose(actual["value_std"], expected.std())
+        actual = table.aggregate(1, funcs=["std"], cols=["value"], ddof=1)
+        assert actual["value_std"].isna().all()  # Single record per bucket
+        with pytest.raises(ValueError):
+            _ = table.aggregate(10, funcs=["median"])
+        with pytest.raises(ValueError):
+            _ = table.aggregate(10, cols=["array"])
+
+    def test_aggregate_large_offset(self, tmp_path):
+        db = necstdb.opendb(tmp_path, mode="w")
+        header = {"data": [{"key": "time", "format": "d"}, {"key": "v", "format": "d"}]}
+        db.create_table("offset", header)
+        values = 1e9 + np.random.default_rng(0).normal(0, 0.01, 1000)
+        table = db.open_table("offset", mode="ab")
+        table.append_many([(1630042890 + i / 100, v) for i, v in enumerate(values)])
+        table.close()
+
+        table = db.open_table("offset")
+        actual = table.aggregate(5, funcs=["mean", "std"], records_per_chunk=77)
+        expected = values.reshape(2, 500)
+        assert np.allclose(actual["v_std"], expected.std(axis=1), rtol=1e-6)
+        assert np.allclose(actual["v_mean"], expected.mean(axis=1), rtol=0, atol=1e-6)
+
+
+class TestStats:
+    def test_stats_disabled(self, timed_db):
+        assert timed_db.stats is None
+        assert timed_db.open_table("sorted").stats is None
+
+    def test_stats(self, timed_db):
+        db = necstdb.opendb(timed_db.path, stats=True)
+        events = []
+        db.stats.hooks.append(lambda *args: events.append(args))
+
+        table = db.open_table("sorted")
+        _ = table.read(astype="sa")
+        _ = table.read(cols=["value"], num=10)
+        table.close()
+        stats = db.stats.as_dict()
+        assert stats["bytes_read"] == 100 * 20 + 10 * 4
+        assert stats["records_decoded"] == {"sa": 100, "tuple": 10}
+        assert {"open", "header", "decode"} <= set(stats["seconds"])
+        assert table.stats.as_dict() == stats
+        assert [args[:2] for args in events] == [
+            ("header", "sorted"),
+            ("open", "sorted"),
+            ("decode", "sorted"),
+            ("decode", "sorted"),
+            ("flush", "sorted"),
+        ]
+
+        writer = db.open_table("sorted", mode="ab")
+        writer.append(TIME + 100, 100, 0.5, 1.5)
+        writer.append_many({"time": [TIME + 101], "value": [101], "array": [[0, 0]]})
+        writer.close()
+        stats = db.stats.as_dict()
+        assert stats["bytes_written"] == 2 * 20
+        assert stats["records_written"] == 2
+        assert writer.stats.as_dict()["records_decoded"] == {}
+
+        db.stats.reset()
+        _ = db.read_tables(["sorted"], astype="df")
+        assert db.stats.as_dict()["records_decoded"] == {"df": 102}
+
+
+class TestAsyncTable:
+    def test_async_append(self, timed_db):
+        async def ingest():
+            tables = [timed_db.async_table(name) for name in ["sorted", "unsorted"]]
+            for i in range(100, 150):
+                for t in tables:
+                    await t.append(TIME + i, i, 0.5, 1.5)
+            await tables[0].append_many(
+                {"time": [TIME + 150], "value": [150], "array": [[0.5, 1.5]]}
+            )
+            await tables[0].flush()
+            assert timed_db.open_table("sorted").read(num=-1, start=150) == (
+                (TIME + 150, 150, 0.5, 1.5),
+            )
+            await timed_db.aclose()
+
+        asyncio.run(ingest())
+        assert timed_db.open_table("sorted").read(cols=["value"], astype="sa")[
+            "value"
+        ].tolist() == list(range(151))
+        assert len(timed_db.open_table("unsorted").read()) == 150
+
+    def test_async_overflow(self, timed_db):
+        async def ingest(overflow):
+            t = timed_db.async_table("sorted", maxsize=2, overflow=overflow)
+            # Unless blocked, the appends never yield to the writer.
+            for i in range(10):
+                await t.append(TIME + 100, i, 0.5, 1.5)
+            await timed_db.aclose()
+            return t.dropped
+
+        assert asyncio.run(ingest("drop")) == 8
+        assert len(timed_db.open_table("sorted").read()) == 102
+        assert asyncio.run(ingest("block")) == 0
+        assert len(timed_db.open_table("sorted").read()) == 112
+        with pytest.raises(ValueError):
+            _ = timed_db.async_table("sorted", overflow="wait")
+
+
+class TestDurability:
+    @pytest.mark.parametrize("durability", ["none", "interval", "group"])
+    def test_durability(self, timed_db, durability):
+        db = necstdb.opendb(timed_db.path, mode="w", stats=True, durability=durability)
+        tables = [db.open_table(name, mode="ab") for name in ["sorted", "unsorted"]]
+        for t in tables:
+            t.append(TIME + 100, 100, 0.5, 1.5)
+        fsyncs = {"none": 0, "interval": 0, "group": 0}[durability]
+        assert db.stats.events.get("fsync", 0) == fsyncs
+
+        # Unbuffered appends are fsynced without explicit flush.
+        db.durability.interval = 0
+        for t in tables:
+            t.append(TIME + 101, 101, 0.5, 1.5)
+        # Group commit also fsyncs the other table written before.
+        fsyncs = {"none": 0, "interval": 2, "group": 3}[durability]
+        assert db.stats.events.get("fsync", 0) == fsyncs
+        if durability != "none":
+            for name in ["sorted", "unsorted"]:
+                assert (db.path / f"{name}.data").stat().st_size == 102 * 20
+
+        db.durability.interval = 60
+        tables[0].append(TIME + 102, 102, 0.5, 1.5)
+        db.sync()
+        fsyncs = {"none": 0, "interval": 2, "group": 4}[durability]
+        assert db.stats.events.get("fsync", 0) == fsyncs
+        if durability == "group":
+            assert (db.path / "sorted.data").stat().st_size == 103 * 20
+
+        tables[1].append(TIME + 102, 102, 0.5, 1.5)
+        _ = [t.close() for t in tables]
+        fsyncs = {"none": 0, "interval": 4, "group": 5}[durability]
+        assert db.stats.events.get("fsync", 0) == fsyncs
+        assert len(db.open_table("unsorted").read()) == 103
+
+    def test_durability_buffered(self, timed_db):
+        db = necstdb.opendb(timed_db.path, mode="w", stats=True, durability="interval")
+        db.durability.interval = 0
+        table = db.open_table("sorted", mode="ab", flush_records=2)
+        table.append(TIME + 100, 100, 0.5, 1.5)
+        assert db.stats.events.get("fsync", 0) == 0
+        table.append(TIME + 101, 101, 0.5, 1.5)  # Flushed, then fsynced
+        assert db.stats.events.get("fsync", 0) == 1
+        table.close()
+
+    def test_unknown_durability(self, timed_db):
+        with pytest.raises(ValueError):
+            _ = necstdb.opendb(timed_db.path, durability="always")
+
+    def test_lock(self, timed_db):
+        db = necstdb.opendb(timed_db.path, mode="w", lock=True)
+        writer = db.open_table("sorted", mode="ab")
+        with pytest.raises(Exception, match="another writer"):
+            _ = db.open_table("sorted", mode="ab")
+        _ = db.open_table("sorted").read()  # Readers are not locked.
+        writer.close()
+        db.open_table("sorted", mode="ab").close()
+
+
+class TestTornTail:
+    @pytest.fixture
+    def torn_db(self, tmp_path) -> necstdb.necstdb.necstdb:
+        db = necstdb.opendb(tmp_path, mode="w")
+        db.create_table("row", TIMED_HEADER.copy())
+        db.create_table("column", TIMED_HEADER.copy(), layout="column")
+        db.create_table(
+            "zlib", TIMED_HEADER.copy(), compression="zlib", block_records=7
+        )
+        db.create_table("empty", TIMED_HEADER.copy())
+        for name in ["row", "column", "zlib"]:
+            table = db.open_table(name, mode="ab")
+            table.append_many([(TIME + i, i, 0.5, 1.5) for i in range(10)])
+            table.close()
+        # Simulate writes interrupted by a crash.
+        with (tmp_path / "row.data").open("ab") as f:
+            f.write(b"\x01" * 7)
+        with (tmp_path / "column.columns" / "time.data").open("ab") as f:
+            f.write(b"\x01" * 11)
+        with (tmp_path / "zlib.index").open("ab") as f:
+            f.write(np.array([(1000, 10, 7)], necstdb.necstdb.BLOCK_INDEX_DTYPE))
+            f.write(b"\x01" * 5)
+        return db
+
+    def test_read_excludes_torn_tail(self, torn_db):
+        for name in ["row", "column", "zlib"]:
+            with pytest.warns(UserWarning, match="incomplete"):
+                table = torn_db.open_table(name)
+            assert table.nrecords == 10
+            assert table.read(astype="sa")["value"].tolist() == list(range(10))
+            assert len(table.read(start=8)) == 2
+            table.close()
+        table = torn_db.open_table("empty")
+        assert table.read() == ()
+        assert len(table.read(astype="sa")) == 0
+
+    def test_verify(self, torn_db):
+        (torn_db.path / "orphan.data").touch()
+        actual = torn_db.verify()
+        assert actual.index.tolist() == ["column", "empty", "orphan", "row", "zlib"]
+        assert actual["damaged"].tolist() == [True, False, True, True, True]
+        assert actual["torn [byte]"].tolist() == [11, 0, 0, 7, 5]
+        assert actual["lost blocks"].tolist() == [0, 0, 0, 0, 1]
+        assert actual.loc["orphan", "error"] == "Missing .header file."
+
+    @pytest.mark.parametrize("repair", ["truncate", "pad"])
+    def test_repair(self, torn_db, repair):
+        for name in ["row", "column", "zlib"]:
+            with pytest.warns(UserWarning, match="repaired"):
+                table = torn_db.open_table(name, mode="ab", repair=repair)
+            table.append(TIME + 10, 10, 0.5, 1.5)
+            table.close()
+        padded = 1 if repair == "pad" else 0
+        actual = torn_db.verify()
+        assert not actual["damaged"].any()
+        assert actual["#records"].tolist() == [11, 0, 11 + padded, 11]
+        assert actual["padded records"].tolist() == [0, 0, padded, 0]
+
+        table = torn_db.open_table("row")
+        assert table.padded_records == ([10] if padded else [])
+        assert table.read()[-1] == (TIME + 10, 10, 0.5, 1.5)
+
+    def test_repair_pad_in_place(self, torn_db):
+        path = torn_db.path / "row.data"
+        original = path.read_bytes()
+        with pytest.warns(UserWarning, match="repaired"):
+            table = torn_db.open_table("row", mode="r+b", repair="pad")
+        table.close()
+        record_size = table.record_size
+        actual = path.read_bytes()
+        assert len(actual) == 11 * record_size
+        assert actual[: 10 * record_size] == original[: 10 * record_size]
+        assert actual[10 * record_size :] == original[10 * record_size :].ljust(
+            record_size, b"\0"
+        )
+        assert torn_db.open_table("row").padded_records == [10]
+
+    def test_no_repair(self, torn_db):
+        original = (torn_db.path / "row.data").read_bytes()
+        with pytest.raises(Exception, match="torn tail"):
+            _ = torn_db.open_table("row", mode="ab")
+        with pytest.raises(Exception, match="torn tail"):
+            _ = torn_db.open_table("row", mode="ab", repair=None)
+        assert (torn_db.path / "row.data").read_bytes() == original
+        with pytest.raises(ValueError):
+            _ = torn_db.open_table("row", mode="ab", repair="ignore")
+
+
+class TestParallelRead:
+    @pytest.mark.parametrize("astype", ["tuple", "dict", "df", "sa", "raw"])
+    def test_read_workers(self, timed_db, astype):
+        table = timed_db.open_table("unsorted")
+        for kwargs in [{}, dict(start=5, num=50, every=3), dict(cols=["value"])]:
+            expected = table.read(astype=astype, **kwargs)
+            actual = table.read(astype=astype, workers=3, **kwargs)
+            if astype == "df":
+                pd.testing.assert_frame_equal(actual, expected)
+            elif astype == "sa":
+                assert actual.dtype == expected.dtype
+                assert actual.tobytes() == expected.tobytes()
+            else:
+                assert actual == expected
+        assert table.read(start=99, workers=3) == table.read(start=99)
+
+    def test_read_workers_recovered(self, tmp_path):
+        # Copied, as the recovery plan is saved in the database.
+        shutil.copytree(Path(".") / "tests" / "example_data", tmp_path / "example")
+        db = necstdb.opendb(tmp_path / "example")
+        with pytest.warns(UserWarning):
+            table = db.open_table("data4").recovered
+        expected = table.read(astype="dict")
+        assert table.read(astype="dict", workers=2) == expected
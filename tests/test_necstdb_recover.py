@@ -1,4 +1,7 @@
+import json
 import pathlib
+import shutil
+import struct
 
 import pytest
 
@@ -11,20 +14,27 @@ def db_path(tmp_path_factory) -> pathlib.Path:
     return tmp_path_factory.mktemp("test_db")
 
 
-class TestReadDatabase:
+@pytest.fixture
+def example_db_path(tmp_path) -> pathlib.Path:
+    """Copy of the example database, in which sidecar files can be written."""
+    path = tmp_path / "example_data"
+    shutil.copytree(pathlib.Path(".") / "tests" / "example_data", path)
+    return path
 
-    EXAMPLE_DATA_PATH = pathlib.Path(".") / "tests" / "example_data"
 
-    def test_read_db_with_invalid_format_specifier(self):
-        db = necstdb.opendb(self.EXAMPLE_DATA_PATH)
-        _ = db.open_table("data4").read(astype="raw")
-        with pytest.raises(ValueError):
+class TestReadDatabase:
+    def test_read_db_with_invalid_format_specifier(self, example_db_path):
+        db = necstdb.opendb(example_db_path)
+        # Record size doesn't divide the file size, which can't be told from torn tail.
+        with pytest.warns(UserWarning, match="recovered"):
+            _ = db.open_table("data4").read(astype="raw")
+        with pytest.warns(UserWarning, match="recovered"):
             _ = db.open_table("data4").read(astype="tuple")
-        with pytest.raises(ValueError):
+        with pytest.warns(UserWarning, match="recovered"):
             _ = db.open_table("data4").read(astype="dict")
-        with pytest.raises(ValueError):
+        with pytest.warns(UserWarning, match="recovered"):
             _ = db.open_table("data4").read(astype="df")
-        with pytest.raises(ValueError):
+        with pytest.warns(UserWarning, match="recovered"):
             _ = db.open_table("data4").read(astype="array")
         actual = db.open_table("data4").recovered.read(astype="raw")
         print(actual)
@@ -37,6 +47,15 @@ class TestReadDatabase:
         actual = db.open_table("data4").recovered.read(astype="array")
         print(actual)
 
+    def test_append_to_misformatted(self, example_db_path):
+        # Trailing bytes which don't make a record may be valid data of wrong format.
+        db = necstdb.opendb(example_db_path)
+        size = (example_db_path / "data4.data").stat().st_size
+        with pytest.raises(Exception, match="torn tail"):
+            _ = db.open_table("data4", mode="ab")
+        assert (example_db_path / "data4.data").stat().st_size == size
+        assert len(db.open_table("data4").recovered.read()) == 11
+
     def test_ignore_trailing_pad_bytes(self, db_path):
         header = {
             "data": [
@@ -59,3 +78,69 @@ class TestReadDatabase:
         assert table.read(astype="dict")[0]["data"] == data
         assert table.read(astype="df")["data"].values[0] == data
         assert table.read(astype="sa")["data"][0] == data
+
+    def test_recovery_plan(self, db_path):
+        header = {
+            "data": [
+                {"key": "name", "format": "5s", "size": 5},
+                {"key": "label", "format": "4s", "size": 4},
+                {"key": "value", "format": "d", "size": 8},
+            ]
+        }
+        db = necstdb.opendb(db_path, mode="w")
+        db.create_table("plan", header)
+        table = db.open_table("plan", mode="ab")
+        for i in range(10):
+            _ = table.append(b"abc", b"x" * (i % 3), float(i))
+        table.close()
+
+        table = db.open_table("plan").recovered
+        actual = [col["format"] for col in table.header["data"]]
+        assert actual == ["3s", "2x", "4s", "d"]
+        plan_path = db_path / "plan.recovery"
+        assert plan_path.exists()
+        with plan_path.open() as f:
+            assert json.load(f)["lengths"] == {"name": 3, "label": None}
+
+        mtime = plan_path.stat().st_mtime_ns
+        _ = db.open_table("plan").recovered.read()  # Plan is reused as it is
+        assert plan_path.stat().st_mtime_ns == mtime
+
+        table = db.open_table("plan", mode="ab")
+        _ = table.append(b"abcd", b"", 10.0)
+        table.close()
+        table = db.open_table("plan").recovered  # Only new records are scanned
+        assert [col["format"] for col in table.header["data"]] == ["5s", "4s", "d"]
+        assert table.read()[-1][0] == b"abcd\x00"
+
+        table = db.open_table("plan", mode="wb")  # Rewritten with as many records
+        for i in range(11):
+            _ = table.append(b"abcde", b"x", float(i))
+        table.close()
+        table = db.open_table("plan").recovered
+        actual = [col["format"] for col in table.header["data"]]
+        assert actual == ["5s", "1s", "3x", "d"]
+        assert table.read()[-1][0] == b"abcde"
+
+    def test_recovered_record_size(self, db_path):
+        header = {
+            "data": [
+                {"key": "time", "format": "d"},
+                {"key": "flag", "format": "i"},
+                {"key": "value", "format": "h"},
+            ]
+        }
+        db = necstdb.opendb(db_path, mode="w")
+        db.create_table("bool", header)
+        # Written by the buggy logger, whose record is smaller than the header tells.
+        records = [(i / 2, bool(i % 2), -i) for i in range(10)]
+        with (db_path / "bool.data").open("wb") as f:
+            f.write(b"".join(struct.pack("@d?h", *record) for record in records))
+
+        with pytest.warns(UserWarning):
+            table = db.open_table("bool").recovered
+        assert table.record_size == struct.calcsize("@d?h")
+        assert table.nrecords == 10
+        assert table.read() == tuple(records)
+        assert table.read(astype="sa")["flag"].tolist() == [r[1] for r in records]
+        assert table.read(astype="df")["value"].tolist() == [r[2] for r in records]
@@ -1,3 +1,6 @@
+import re
+import struct
+
 from necstdb import utils
 
 TEST_FORMATS = ["d", "?", "3f", "3s", "b"]
@@ -23,3 +26,22 @@ EXPECTED_FLATTENED = [True, 2.0, 3.0, 4, 5, "six"]
 def test_flatten_data():
     actual = utils.flatten_data(TEST_DATA)
     assert actual == EXPECTED_FLATTENED
+
+
+def test_get_struct_indices_layout_rules():
+    formats = ["c", "d", "3s", "i", "2h", "x", "dic", "0l", "5p", "?", "4x", "q"]
+    for endian in ["", "@", "=", "<", ">", "!"]:
+        actual = utils.get_struct_indices(formats, endian)
+        assert actual[-1] == struct.calcsize(endian + "".join(formats))
+        for i, fmt in enumerate(formats):
+            # Field starts where its first item is placed, after alignment.
+            char = re.match(r"\d*(\D)", fmt).group(1)
+            prefix = endian + "".join(formats[:i])
+            expected = struct.calcsize(prefix + char) - struct.calcsize(endian + char)
+            assert actual[i] == expected, (endian, fmt)
+
+
+def test_get_struct_indices_trailing_padding():
+    assert utils.get_struct_indices(["q", "h", "0q"], "@") == [0, 8, 16, 16]
+    assert utils.get_struct_indices(["q", "h", "0q"], "<") == [0, 8, 10, 10]
+    assert utils.get_struct_sizes(["q", "h", "0q"], "@") == [8, 8, 0]